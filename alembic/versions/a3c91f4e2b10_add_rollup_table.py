@@ -0,0 +1,42 @@
+"""Add rollup table
+
+Revision ID: a3c91f4e2b10
+Revises: 5bd3d6703520
+Create Date: 2026-10-18 09:12:41.503112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c91f4e2b10'
+down_revision: Union[str, None] = '5bd3d6703520'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rollup',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('period', sa.String(), nullable=False),
+    sa.Column('metric', sa.String(), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=True),
+    sa.Column('total', sa.Float(), nullable=True),
+    sa.Column('minimum', sa.Float(), nullable=True),
+    sa.Column('maximum', sa.Float(), nullable=True),
+    sa.Column('last', sa.Float(), nullable=True),
+    sa.Column('last_timestamp', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('period', 'metric', 'bucket', name='uq_rollup_period_metric_bucket')
+    )
+    op.create_index(op.f('ix_rollup_id'), 'rollup', ['id'], unique=False)
+    # Existing rows are summarised with: python -m app.service.rollup backfill
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_rollup_id'), table_name='rollup')
+    op.drop_table('rollup')
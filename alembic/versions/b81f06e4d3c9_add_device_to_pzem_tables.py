@@ -0,0 +1,39 @@
+"""Add device to pzem tables
+
+Revision ID: b81f06e4d3c9
+Revises: e5a8c3d61f27
+Create Date: 2026-10-18 16:27:13.904552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81f06e4d3c9'
+down_revision: Union[str, None] = 'e5a8c3d61f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ['pzem', 'pzem_aggregate', 'pzem_event']
+
+
+def upgrade() -> None:
+    # pzem is created by create_all on a new database (after the migrations),
+    # already with the column and index
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    # Existing readings all came from the single meter, now called "main"
+    for table in TABLES:
+        if table not in existing:
+            continue
+        op.add_column(table, sa.Column('device', sa.String(), server_default='main', nullable=True))
+        op.create_index(f'ix_{table}_device_timestamp', table, ['device', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_device_timestamp', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('device')
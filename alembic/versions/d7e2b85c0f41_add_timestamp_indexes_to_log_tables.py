@@ -0,0 +1,32 @@
+"""Add timestamp indexes to log tables
+
+Revision ID: d7e2b85c0f41
+Revises: a3c91f4e2b10
+Create Date: 2026-10-18 10:41:07.218334
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e2b85c0f41'
+down_revision: Union[str, None] = 'a3c91f4e2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # In SQLite every index entry ends with the rowid, so these also serve
+    # ORDER BY timestamp, id (keyset pagination) without a sort
+    op.create_index(op.f('ix_recommendation_log_timestamp'), 'recommendation_log', ['timestamp'], unique=False)
+    op.create_index(op.f('ix_emission_log_timestamp'), 'emission_log', ['timestamp'], unique=False)
+    op.create_index(op.f('ix_pmv_log_timestamp'), 'pmv_log', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pmv_log_timestamp'), table_name='pmv_log')
+    op.drop_index(op.f('ix_emission_log_timestamp'), table_name='emission_log')
+    op.drop_index(op.f('ix_recommendation_log_timestamp'), table_name='recommendation_log')
@@ -0,0 +1,69 @@
+"""Add pzem_aggregate and pzem_event tables
+
+Revision ID: e5a8c3d61f27
+Revises: d7e2b85c0f41
+Create Date: 2026-10-18 14:02:55.380417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8c3d61f27'
+down_revision: Union[str, None] = 'd7e2b85c0f41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('pzem_aggregate',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('interval_start', sa.DateTime(), nullable=True),
+    sa.Column('samples', sa.Integer(), nullable=True),
+    sa.Column('missed', sa.Integer(), nullable=True),
+    sa.Column('voltage_min', sa.Float(), nullable=True),
+    sa.Column('voltage_max', sa.Float(), nullable=True),
+    sa.Column('voltage_mean', sa.Float(), nullable=True),
+    sa.Column('voltage_last', sa.Float(), nullable=True),
+    sa.Column('current_min', sa.Float(), nullable=True),
+    sa.Column('current_max', sa.Float(), nullable=True),
+    sa.Column('current_mean', sa.Float(), nullable=True),
+    sa.Column('current_last', sa.Float(), nullable=True),
+    sa.Column('power_min', sa.Float(), nullable=True),
+    sa.Column('power_max', sa.Float(), nullable=True),
+    sa.Column('power_mean', sa.Float(), nullable=True),
+    sa.Column('power_last', sa.Float(), nullable=True),
+    sa.Column('power_factor_min', sa.Float(), nullable=True),
+    sa.Column('power_factor_max', sa.Float(), nullable=True),
+    sa.Column('power_factor_mean', sa.Float(), nullable=True),
+    sa.Column('power_factor_last', sa.Float(), nullable=True),
+    sa.Column('energy', sa.Float(), nullable=True),
+    sa.Column('frequency', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pzem_aggregate_id'), 'pzem_aggregate', ['id'], unique=False)
+    op.create_index(op.f('ix_pzem_aggregate_timestamp'), 'pzem_aggregate', ['timestamp'], unique=False)
+    op.create_table('pzem_event',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('kind', sa.String(), nullable=True),
+    sa.Column('duration', sa.Float(), nullable=True),
+    sa.Column('value', sa.Float(), nullable=True),
+    sa.Column('baseline', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_pzem_event_id'), 'pzem_event', ['id'], unique=False)
+    op.create_index(op.f('ix_pzem_event_timestamp'), 'pzem_event', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_pzem_event_timestamp'), table_name='pzem_event')
+    op.drop_index(op.f('ix_pzem_event_id'), table_name='pzem_event')
+    op.drop_table('pzem_event')
+    op.drop_index(op.f('ix_pzem_aggregate_timestamp'), table_name='pzem_aggregate')
+    op.drop_index(op.f('ix_pzem_aggregate_id'), table_name='pzem_aggregate')
+    op.drop_table('pzem_aggregate')
@@ -1,11 +1,17 @@
 from .database import Base
-from sqlalchemy import Column, Integer, Float, DateTime, String
+from sqlalchemy import Column, Integer, Float, DateTime, String, UniqueConstraint, Index
 import datetime
 
+# The meter the derived data (interest, emission, rollups) is computed from;
+# other PZEM devices are stored and listed, but only charted on request
+PRIMARY_DEVICE = "main"
+
 class Pzem(Base):
     __tablename__ = "pzem"
+    __table_args__ = (Index("ix_pzem_device_timestamp", "device", "timestamp"),)
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     timestamp = Column(DateTime, index=True, default=datetime.datetime.now)
+    device = Column(String, default=PRIMARY_DEVICE, server_default=PRIMARY_DEVICE)
     voltage = Column(Float)
     current = Column(Float)
     power = Column(Float)
@@ -52,7 +58,7 @@ class RecommendationLog(Base):
     __tablename__ = "recommendation_log"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp = Column(DateTime, default=datetime.datetime.now)
+    timestamp = Column(DateTime, index=True, default=datetime.datetime.now)
 
     current_t_set = Column(Integer)
     current_power = Column(Float)
@@ -65,7 +71,7 @@ class EmissionLog(Base):
     __tablename__ = "emission_log"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp = Column(DateTime, default=datetime.datetime.now)
+    timestamp = Column(DateTime, index=True, default=datetime.datetime.now)
     energy = Column(Float)  # Wh
     emission = Column(Float)  # metric tons of CO2 equivalent
 
@@ -73,9 +79,67 @@ class PMVLog(Base):
     __tablename__ = "pmv_log"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp = Column(DateTime, default=datetime.datetime.now)
+    timestamp = Column(DateTime, index=True, default=datetime.datetime.now)
     t_indoor = Column(Float)
     h_indoor = Column(Float)
     pmv = Column(Float)
     ppd = Column(Float)
-    
+
+class Rollup(Base):
+    """Hourly/daily summary of one metric, kept up to date by service.rollup."""
+    __tablename__ = "rollup"
+    __table_args__ = (UniqueConstraint("period", "metric", "bucket", name="uq_rollup_period_metric_bucket"),)
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    period = Column(String, nullable=False)  # "hour" | "day"
+    metric = Column(String, nullable=False)
+    bucket = Column(DateTime, nullable=False)  # start of the hour/day
+    count = Column(Integer, default=0)
+    total = Column(Float, default=0)
+    minimum = Column(Float)
+    maximum = Column(Float)
+    last = Column(Float)
+    last_timestamp = Column(DateTime)
+
+class PzemAggregate(Base):
+    """One interval of high-frequency PZEM samples, written by service.pzem_poller."""
+    __tablename__ = "pzem_aggregate"
+    __table_args__ = (Index("ix_pzem_aggregate_device_timestamp", "device", "timestamp"),)
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    timestamp = Column(DateTime, index=True, default=datetime.datetime.now)  # end of the interval
+    device = Column(String, default=PRIMARY_DEVICE, server_default=PRIMARY_DEVICE)
+    interval_start = Column(DateTime)
+    samples = Column(Integer)
+    missed = Column(Integer)  # failed reads in the interval
+    voltage_min = Column(Float)
+    voltage_max = Column(Float)
+    voltage_mean = Column(Float)
+    voltage_last = Column(Float)
+    current_min = Column(Float)
+    current_max = Column(Float)
+    current_mean = Column(Float)
+    current_last = Column(Float)
+    power_min = Column(Float)
+    power_max = Column(Float)
+    power_mean = Column(Float)
+    power_last = Column(Float)
+    power_factor_min = Column(Float)
+    power_factor_max = Column(Float)
+    power_factor_mean = Column(Float)
+    power_factor_last = Column(Float)
+    energy = Column(Float)  # Wh, counter at the end of the interval
+    frequency = Column(Float)
+
+class PzemEvent(Base):
+    """A power spike or voltage excursion seen by the high-frequency poller."""
+    __tablename__ = "pzem_event"
+    __table_args__ = (Index("ix_pzem_event_device_timestamp", "device", "timestamp"),)
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    timestamp = Column(DateTime, index=True, default=datetime.datetime.now)  # start of the excursion
+    device = Column(String, default=PRIMARY_DEVICE, server_default=PRIMARY_DEVICE)
+    kind = Column(String)  # "power_spike" | "voltage_sag" | "voltage_swell"
+    duration = Column(Float)  # seconds
+    value = Column(Float)  # peak (or lowest voltage for a sag)
+    baseline = Column(Float)  # typical value before the event
@@ -3,10 +3,17 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.templating import Jinja2Templates
 from starlette import status
 from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
 from fastapi.responses import HTMLResponse
 
 from ..database import Sessionlocal
+from ..utils.pagination import paginate, PAGE_SIZE
+from ..utils.aggregation import aggregate
+from ..utils.state_store import state_store
 from ..models import AHT10
+from ..service import rollup, ingest
+from ..service.write_buffer import BufferFull
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -26,6 +33,9 @@ class AHT10Request(BaseModel):
     temperature: float = Field(description="Temperature", ge=-40.0, le=200.0)
     humidity: float = Field(description="Humidity", ge=0.0, le=100.0)
 
+class AHT10BulkRequest(AHT10Request):
+    timestamp: Optional[datetime] = Field(default=None, description="Time the reading was taken on the device")
+
 ### Pages ###
 @router.get("/", response_class=HTMLResponse)
 async def aht10(request: Request):
@@ -37,34 +47,36 @@ async def create_aht10(aht10_request: AHT10Request, db: Session = Depends(get_db
     if not aht10_request:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid request")
     
-    aht10 = AHT10(**aht10_request.model_dump())
-    db.add(aht10)
-    db.commit()
+    try:
+        aht10 = await ingest.submit_reading(AHT10, aht10_request.model_dump(), db)
+    except BufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
     return {
         "temperature": aht10.temperature,
         "humidity": aht10.humidity
     }
 
+@router.post("/bulk", status_code=status.HTTP_200_OK)
+async def create_aht10_bulk(request: Request, db: Session = Depends(get_db)):
+    try:
+        items = ingest.parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return ingest.insert_bulk(AHT10, AHT10BulkRequest, items, db)
+
 @router.get("/data_aht10", status_code=status.HTTP_200_OK)
-async def read_aht10_data(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
-
-    aht10_records = (
-        db.query(AHT10)
-        .order_by(AHT10.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(AHT10).count()
-    total_pages = (total_records + limit - 1) // limit
+async def read_aht10_data(
+    page: int = 1, limit: int = PAGE_SIZE, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
+    try:
+        aht10_records, meta = paginate(db, AHT10, page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
-        "total_records": total_records,
+        **meta,
         "data": [
             {
                 "id": record.id,
@@ -76,6 +88,20 @@ async def read_aht10_data(page: int = 1, db: Session = Depends(get_db)):
         ],
     }
 
+@router.get("/aggregate", status_code=status.HTTP_200_OK)
+async def aggregate_aht10_data(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    points: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return aggregate(db, AHT10, start, end, bucket, fields, points)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.put("/update/{aht10_id}", status_code=status.HTTP_200_OK)
 async def update_aht10(
     aht10_id: int, aht10_request: AHT10Request, db: Session = Depends(get_db)
@@ -88,7 +114,9 @@ async def update_aht10(
 
     aht10.temperature = aht10_request.temperature
     aht10.humidity = aht10_request.humidity
+    rollup.refresh(db, AHT10, aht10.timestamp)
     db.commit()
+    state_store.invalidate(AHT10)
     return {"message": "AHT10 data updated successfully"}
 
     
@@ -100,7 +128,9 @@ async def delete_aht10(aht10_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AHT10 not found")
         
         db.delete(aht10)
+        rollup.refresh(db, AHT10, aht10.timestamp)
         db.commit()
+        state_store.invalidate(AHT10)
         return {"message": "AHT10 data deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
@@ -1,17 +1,19 @@
+import asyncio
+import os
+import threading
+from typing import Optional
 import numpy as np
-import pandas as pd
-import joblib
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, HTTPException
 from starlette import status
-from tensorflow import keras
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.losses import MeanSquaredError
-from tensorflow.keras.metrics import MeanAbsoluteError
 from datetime import datetime
 
 from ..database import Sessionlocal
+from ..utils.pagination import paginate, PAGE_SIZE
 from ..models import DataAnalysis, RecommendationLog
+from ..utils.power_model import load_backend
+from ..utils.ttl_cache import TTLCache
+from ..utils.state_store import state_store
 
 router = APIRouter(
     prefix="/analysis",
@@ -25,38 +27,64 @@ def get_db():
     finally:
         db.close()
 
-# Load once at module level
-model = keras.models.load_model('models/prediction_model.h5', compile=False)
-scaler_X = joblib.load('models/scaler_X.pkl')
-scaler_y = joblib.load('models/scaler_y.pkl')
+# Loaded once, on first use or by the startup warm-up (backend chosen by POWER_MODEL_BACKEND)
+_power_model = None
+_power_model_lock = threading.Lock()
+
+def get_power_model():
+    global _power_model
+    with _power_model_lock:
+        if _power_model is None:
+            _power_model = load_backend()
+    return _power_model
+
+# Candidate setpoints scored by the recommendation model (inclusive range)
+T_SET_MIN = int(os.environ.get("T_SET_MIN", 17))
+T_SET_MAX = int(os.environ.get("T_SET_MAX", 20))
+
+# Dashboard polls reuse the last prediction while the sensor state is unchanged.
+# Inputs are rounded to these steps for the cache key only; a prediction is
+# always computed from the measured values.
+RECOMMENDATION_CACHE_TTL = float(os.environ.get("RECOMMENDATION_CACHE_TTL", 900))  # seconds
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 256))
+QUANTUM = {
+    'H_indoor': 0.5,  # %
+    'T_outdoor': 0.1,  # °C
+    'H_outdoor': 0.5,  # %
+    'N': 1,
+    'power': 1.0,  # W
+}
+
+recommendation_cache = TTLCache(
+    "recommendation", maxsize=RECOMMENDATION_CACHE_SIZE, ttl=RECOMMENDATION_CACHE_TTL
+)
 
-# Compile the model
-model.compile(optimizer=Adam(),
-              loss=MeanSquaredError(),
-              metrics=[MeanAbsoluteError()])
+def quantise(name, value):
+    if value is None:
+        return None
+    step = QUANTUM.get(name)
+    return round(round(value / step) * step, 4) if step else value
 
-def recommend_optimal_T_set(model, scaler_X, scaler_y, real_time_data, current_T_set, current_actual_power):
-    comfort_range = range(17, 21)
-    feature_order = scaler_X.feature_names_in_ if hasattr(scaler_X, 'feature_names_in_') else ['T_set', 'H_indoor', 'T_outdoor', 'H_outdoor', 'N']
+def recommend_optimal_T_set(power_model, real_time_data, current_T_set, current_actual_power, comfort_range=None):
+    if comfort_range is None:
+        comfort_range = range(T_SET_MIN, T_SET_MAX + 1)
+    feature_order = power_model.feature_names
     candidates = []
 
-    for T_set_candidate in comfort_range:
-        if T_set_candidate == current_T_set:
-            continue
-
-        # Build feature vector with correct order
-        feature_values = [
-            T_set_candidate if name == 'T_set' else real_time_data.get(name, 0)
-            for name in feature_order
+    T_set_candidates = [T_set for T_set in comfort_range if T_set != current_T_set]
+    if T_set_candidates:
+        # One row per candidate, all scored in a single forward pass
+        features = np.array([
+            [T_set if name == 'T_set' else real_time_data.get(name, 0) for name in feature_order]
+            for T_set in T_set_candidates
+        ], dtype=float)
+        pred_power = power_model.predict_power(features)
+
+        candidates = [
+            (T_set, power)
+            for T_set, power in zip(T_set_candidates, pred_power)
+            if power < current_actual_power
         ]
-        features_df = pd.DataFrame([feature_values], columns=feature_order)
-
-        features_scaled = scaler_X.transform(features_df)
-        pred_power_scaled = model.predict(features_scaled, verbose=0)
-        pred_power = scaler_y.inverse_transform(pred_power_scaled)[0][0]
-
-        if pred_power < current_actual_power:
-            candidates.append((T_set_candidate, pred_power))
 
     if candidates:
         optimal_T_set, optimal_power = min(candidates, key=lambda x: x[1])
@@ -77,7 +105,7 @@ def recommend_optimal_T_set(model, scaler_X, scaler_y, real_time_data, current_T
 
 @router.get("/recommendation-model", status_code=status.HTTP_200_OK)
 async def get_model_recommendation(db: Session = Depends(get_db)):
-    latest_data = db.query(DataAnalysis).order_by(DataAnalysis.timestamp.desc()).first()
+    latest_data = state_store.latest(db, DataAnalysis)
 
     if not latest_data:
         raise HTTPException(
@@ -96,17 +124,25 @@ async def get_model_recommendation(db: Session = Depends(get_db)):
     current_T_set = latest_data.ac_temperature
     current_actual_power = latest_data.power
 
-    result = recommend_optimal_T_set(
-        model, scaler_X, scaler_y,
-        real_time_data, current_T_set, current_actual_power
+    try:
+        # The first call may still be loading the model (warm-up); don't block the event loop on it
+        power_model = await asyncio.to_thread(get_power_model)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Prediction model unavailable: {e}"
+        )
+
+    cache_key = (
+        power_model.name, T_SET_MIN, T_SET_MAX, current_T_set, quantise('power', current_actual_power),
+        *(quantise(name, real_time_data[name]) for name in sorted(real_time_data)),
+    )
+    result = recommendation_cache.get_or_compute(
+        cache_key,
+        lambda: recommend_optimal_T_set(power_model, real_time_data, current_T_set, current_actual_power),
     )
 
     # ✅ Only log if the T_set has changed
-    last_log = (
-        db.query(RecommendationLog)
-        .order_by(RecommendationLog.timestamp.desc())
-        .first()
-    )
+    last_log = state_store.latest(db, RecommendationLog)
 
     if not last_log or last_log.current_t_set != current_T_set:
         log = RecommendationLog(
@@ -120,6 +156,7 @@ async def get_model_recommendation(db: Session = Depends(get_db)):
         )
         db.add(log)
         db.commit()
+        state_store.record(RecommendationLog, log)
 
     return {
         "timestamp": latest_data.timestamp.strftime("%Y-%m-%d %H:%M"),
@@ -133,7 +170,7 @@ async def get_model_recommendation(db: Session = Depends(get_db)):
 
 @router.get("/recommendations", status_code=status.HTTP_200_OK)
 async def get_recommendations(db: Session = Depends(get_db)):
-    latest_data = db.query(DataAnalysis).order_by(DataAnalysis.timestamp.desc()).first()
+    latest_data = state_store.latest(db, DataAnalysis)
 
     if not latest_data:
         raise HTTPException(
@@ -163,23 +200,16 @@ async def get_recommendations(db: Session = Depends(get_db)):
     }
 
 @router.get("/recommendation-log", status_code=status.HTTP_200_OK)
-async def get_recommendation_logs(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
-
-    logs = (
-        db.query(RecommendationLog)
-        .order_by(RecommendationLog.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(RecommendationLog).count()
-    total_pages = (total_records + limit - 1) // limit
+async def get_recommendation_logs(
+    page: int = 1, limit: int = PAGE_SIZE, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
+    try:
+        logs, meta = paginate(db, RecommendationLog, page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
+        **meta,
         "data": [
             {
                 "timestamp": log.timestamp.strftime("%Y-%m-%d %H:%M"),
@@ -1,16 +1,22 @@
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
 from starlette import status
 from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 import os
-import cv2
 
 from ..database import Sessionlocal
+from ..utils.pagination import paginate, PAGE_SIZE
+from ..utils.aggregation import aggregate
+from ..utils.state_store import state_store
 from ..models import Camera
-from ..utils.camera_manager import camera_stream
-import time
+from ..utils.mjpeg_broadcaster import get_broadcaster
+from ..utils.camera_manager import camera_registry
+from ..service import rollup, ingest
+from ..service.write_buffer import BufferFull
 
 templates = Jinja2Templates(directory="app/templates")
 execution_path = os.getcwd()
@@ -30,6 +36,9 @@ def get_db():
 class CameraRequest(BaseModel):
     occupant: int = Field(description="Occupant(s)", ge=0)
 
+class CameraBulkRequest(CameraRequest):
+    timestamp: Optional[datetime] = Field(default=None, description="Time the reading was taken on the device")
+
 ### Pages ###
 @router.get("/", response_class=HTMLResponse)
 async def camera(request: Request):
@@ -40,31 +49,32 @@ async def camera(request: Request):
 async def create_camera(camera_request: CameraRequest, db: Session = Depends(get_db)):
     if not camera_request:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid request")
-    camera = Camera(**camera_request.model_dump())
-    
-    db.add(camera)
-    db.commit()
+    try:
+        camera = await ingest.submit_reading(Camera, camera_request.model_dump(), db)
+    except BufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     return camera
 
+@router.post("/bulk", status_code=status.HTTP_200_OK)
+async def create_camera_bulk(request: Request, db: Session = Depends(get_db)):
+    try:
+        items = ingest.parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return ingest.insert_bulk(Camera, CameraBulkRequest, items, db)
+
 @router.get("/data_occupancy", status_code=status.HTTP_200_OK)
-async def read_camera_data(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
-
-    camera_records = (
-        db.query(Camera)
-        .order_by(Camera.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(Camera).count()
-    total_pages = (total_records + limit - 1) // limit
+async def read_camera_data(
+    page: int = 1, limit: int = PAGE_SIZE, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
+    try:
+        camera_records, meta = paginate(db, Camera, page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
-        "total_records": total_records,
+        **meta,
         "data": [
             {
                 "id": record.id,
@@ -74,7 +84,21 @@ async def read_camera_data(page: int = 1, db: Session = Depends(get_db)):
             for record in camera_records
         ],
     }
-    
+
+@router.get("/aggregate", status_code=status.HTTP_200_OK)
+async def aggregate_camera_data(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    points: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return aggregate(db, Camera, start, end, bucket, fields, points)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.put("/update/{camera_id}", status_code=status.HTTP_200_OK)
 async def update_camera(camera_id: int, camera_request: CameraRequest, db: Session = Depends(get_db)):
     try:
@@ -83,7 +107,9 @@ async def update_camera(camera_id: int, camera_request: CameraRequest, db: Sessi
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Camera not found")
         
         camera.occupant = camera_request.occupant
+        rollup.refresh(db, Camera, camera.timestamp)
         db.commit()
+        state_store.invalidate(Camera)
         return camera
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -96,30 +122,34 @@ async def delete_camera(camera_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Camera not found")
         
         db.delete(camera)
+        rollup.refresh(db, Camera, camera.timestamp)
         db.commit()
+        state_store.invalidate(Camera)
         return {"message": "Camera data deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     
 @router.get("/stream")
-async def video_stream():
+async def video_stream(
+    camera: Optional[str] = Query(None, description="Camera name, defaults to the first configured camera"),
+    fps: float = Query(5.0, gt=0, le=30, description="Maximum frames per second"),
+    quality: int = Query(50, ge=10, le=95, description="JPEG quality"),
+    width: int = Query(0, ge=0, le=1920, description="Output width in pixels, 0 keeps the camera size"),
+):
+    try:
+        broadcaster = get_broadcaster(camera)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
     return StreamingResponse(
-        generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame"
+        broadcaster.frames(quality=quality, width=width, fps=fps),
+        media_type="multipart/x-mixed-replace; boundary=frame",
     )
 
-def generate_frames():
-    while True:
-        frame = camera_stream.get_frame()
-        if frame is None:
-            continue
-
-        # Kompres gambar dengan kualitas rendah agar lebih ringan
-        _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 50])
-        frame_bytes = buffer.tobytes()
-
-        yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n")
-        time.sleep(0.2)  # Batasi FPS ke 5 FPS
 
+@router.get("/cameras", status_code=status.HTTP_200_OK)
+async def list_cameras():
+    return {"default": camera_registry.default, "cameras": camera_registry.names()}
 
 @router.get("/latest_images")
 async def get_latest_images(db: Session = Depends(get_db)):
@@ -131,7 +161,7 @@ async def get_latest_images(db: Session = Depends(get_db)):
         input_files = [
             os.path.join(input_dir, f)
             for f in os.listdir(input_dir)
-            if f.endswith(".png")
+            if f.endswith((".jpg", ".png"))
         ]
         # Sort by creation time (newest first)
         input_files.sort(key=os.path.getctime, reverse=True)
@@ -140,7 +170,7 @@ async def get_latest_images(db: Session = Depends(get_db)):
         output_files = [
             os.path.join(output_dir, f)
             for f in os.listdir(output_dir)
-            if f.endswith(".png")
+            if f.endswith((".jpg", ".png"))
         ]
         # Sort by creation time (newest first)
         output_files.sort(key=os.path.getctime, reverse=True)
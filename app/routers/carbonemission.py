@@ -1,9 +1,13 @@
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, Request
+from typing import Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from starlette import status
 from ..database import Sessionlocal
+from ..utils.pagination import paginate, PAGE_SIZE
+from ..utils.aggregation import aggregate
 from ..service import emission
 from ..models import EmissionLog
 
@@ -28,24 +32,16 @@ async def emission_page(request: Request):
 
 ### 📊 Emission History Data (Paginated) ###
 @router.get("/data_emission", status_code=status.HTTP_200_OK)
-async def read_emission_data(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
-
-    emission_records = (
-        db.query(EmissionLog)
-        .order_by(EmissionLog.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(EmissionLog).count()
-    total_pages = (total_records + limit - 1) // limit
+async def read_emission_data(
+    page: int = 1, limit: int = PAGE_SIZE, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
+    try:
+        emission_records, meta = paginate(db, EmissionLog, page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
-        "total_records": total_records,
+        **meta,
         "data": [
             {
                 "id": record.id,
@@ -57,6 +53,20 @@ async def read_emission_data(page: int = 1, db: Session = Depends(get_db)):
         ],
     }
 
+@router.get("/aggregate", status_code=status.HTTP_200_OK)
+async def aggregate_emission_data(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    points: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return aggregate(db, EmissionLog, start, end, bucket, fields, points)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 ### 📈 Real-time + Daily Emission Summary ###
 @router.get("/status", status_code=status.HTTP_200_OK)
 async def get_emission_status(db: Session = Depends(get_db)):
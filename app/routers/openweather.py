@@ -2,11 +2,18 @@ from sqlalchemy.orm import Session
 from fastapi import APIRouter, HTTPException, Depends, Request
 from starlette import status
 from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from ..database import Sessionlocal
+from ..utils.pagination import paginate, PAGE_SIZE
+from ..utils.aggregation import aggregate
+from ..utils.state_store import state_store
 from ..models import OpenWeather
+from ..service import rollup, ingest
+from ..service.write_buffer import BufferFull
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -27,6 +34,9 @@ class OpenWeatherRequest(BaseModel):
     feels_like: float = Field(description="Feels Like", ge=-40.0, le=80.0)
     humidity: float = Field(description="Humidity", ge=0.0, le=100.0)
 
+class OpenWeatherBulkRequest(OpenWeatherRequest):
+    timestamp: Optional[datetime] = Field(default=None, description="Time the reading was taken on the device")
+
 ### Pages ###
 @router.get("/", response_class=HTMLResponse)
 async def openweather(request: Request):
@@ -37,31 +47,32 @@ async def openweather(request: Request):
 async def create_openweather(openweather_request: OpenWeatherRequest, db: Session = Depends(get_db)):
     if not openweather_request:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid request")
-    openweather = OpenWeather(**openweather_request.model_dump())
-    
-    db.add(openweather)
-    db.commit()
+    try:
+        openweather = await ingest.submit_reading(OpenWeather, openweather_request.model_dump(), db)
+    except BufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     return openweather
 
-@router.get("/data_openweather", status_code=status.HTTP_200_OK)
-async def read_openweather_data(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
+@router.post("/bulk", status_code=status.HTTP_200_OK)
+async def create_openweather_bulk(request: Request, db: Session = Depends(get_db)):
+    try:
+        items = ingest.parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    openweather_records = (
-        db.query(OpenWeather)
-        .order_by(OpenWeather.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(OpenWeather).count()
-    total_pages = (total_records + limit - 1) // limit
+    return ingest.insert_bulk(OpenWeather, OpenWeatherBulkRequest, items, db)
+
+@router.get("/data_openweather", status_code=status.HTTP_200_OK)
+async def read_openweather_data(
+    page: int = 1, limit: int = PAGE_SIZE, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
+    try:
+        openweather_records, meta = paginate(db, OpenWeather, page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
-        "total_records": total_records,
+        **meta,
         "data": [
             {
                 "id": record.id,
@@ -74,6 +85,20 @@ async def read_openweather_data(page: int = 1, db: Session = Depends(get_db)):
         ],
     }
 
+@router.get("/aggregate", status_code=status.HTTP_200_OK)
+async def aggregate_openweather_data(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    points: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return aggregate(db, OpenWeather, start, end, bucket, fields, points)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @router.put("/update/{openweather_id}", status_code=status.HTTP_200_OK)
 async def update_openweather(openweather_id: int, openweather_request: OpenWeatherRequest, db: Session = Depends(get_db)):
     try:
@@ -84,7 +109,9 @@ async def update_openweather(openweather_id: int, openweather_request: OpenWeath
         openweather.temperature = openweather_request.temperature
         openweather.feels_like = openweather_request.feels_like
         openweather.humidity = openweather_request.humidity
+        rollup.refresh(db, OpenWeather, openweather.timestamp)
         db.commit()
+        state_store.invalidate(OpenWeather)
         return openweather
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -97,7 +124,9 @@ async def delete_openweather(openweather_id: int, db: Session = Depends(get_db))
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="OpenWeather not found")
         
         db.delete(openweather)
+        rollup.refresh(db, OpenWeather, openweather.timestamp)
         db.commit()
+        state_store.invalidate(OpenWeather)
         return {"message": "OpenWeather data deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
@@ -1,9 +1,13 @@
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, Request
+from typing import Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from starlette import status
 from ..database import Sessionlocal
+from ..utils.pagination import paginate, PAGE_SIZE
+from ..utils.aggregation import aggregate
 from ..service import pmv
 from ..service.pmv import pmv_to_comfort_status
 from ..models import PMVLog
@@ -24,24 +28,16 @@ def get_db():
 
 ### 📊 PMV History (Paginated) ###
 @router.get("/data_pmv", status_code=status.HTTP_200_OK)
-async def read_pmv_data(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
-
-    pmv_records = (
-        db.query(PMVLog)
-        .order_by(PMVLog.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(PMVLog).count()
-    total_pages = (total_records + limit - 1) // limit
+async def read_pmv_data(
+    page: int = 1, limit: int = PAGE_SIZE, cursor: Optional[str] = None, db: Session = Depends(get_db)
+):
+    try:
+        pmv_records, meta = paginate(db, PMVLog, page, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
-        "total_records": total_records,
+        **meta,
         "data": [
             {
                 "id": record.id,
@@ -54,6 +50,19 @@ async def read_pmv_data(page: int = 1, db: Session = Depends(get_db)):
         ],
     }
 
+@router.get("/aggregate", status_code=status.HTTP_200_OK)
+async def aggregate_pmv_data(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    points: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return aggregate(db, PMVLog, start, end, bucket, fields, points)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 ### 📈 Real-time PMV Result from Latest AHT10 ###
 @router.get("/status", status_code=status.HTTP_200_OK)
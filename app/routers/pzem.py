@@ -1,13 +1,21 @@
+import asyncio
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, HTTPException, Depends, Request
 from starlette import status
 from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
 from ..database import Sessionlocal
-from ..models import Pzem
-from ..service import pzem_sensor
+from ..utils.pagination import paginate, PAGE_SIZE
+from ..utils.aggregation import aggregate
+from ..utils.state_store import state_store
+from ..models import Pzem, PzemAggregate, PzemEvent, PRIMARY_DEVICE
+from ..service import rollup, pzem_sensor, ingest
+from ..service.pzem_poller import pzem_poller, FIELDS
+from ..service.write_buffer import BufferFull
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -30,6 +38,13 @@ class PzemRequest(BaseModel):
     energy: float = Field(description="Energy", ge=0.0)
     frequency: float = Field(description="Frequency", ge=0.0)
     power_factor: float = Field(description="Power Factor", ge=0.0)
+    device: str = Field(default=PRIMARY_DEVICE, description="Meter name from PZEM_DEVICES", min_length=1)
+
+class PzemBulkRequest(PzemRequest):
+    timestamp: Optional[datetime] = Field(default=None, description="Time the reading was taken on the device")
+
+def device_filter(model, device):
+    return [model.device == device] if device else []
 
 ### Pages ###
 @router.get("/", response_class=HTMLResponse)
@@ -41,14 +56,15 @@ async def pzem(request: Request):
 async def create_pzem(pzem_request: PzemRequest, db: Session = Depends(get_db)):
     if not pzem_request:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid request")
-    pzem = Pzem(**pzem_request.model_dump())
-    
-    db.add(pzem)
-    db.commit()
+    try:
+        pzem = await ingest.submit_reading(Pzem, pzem_request.model_dump(), db)
+    except BufferFull as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
 
     return {
         "id": pzem.id,
         "timestamp": pzem.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+        "device": pzem.device,
         "voltage": pzem.voltage,
         "current": pzem.current,
         "power": pzem.power,
@@ -57,30 +73,36 @@ async def create_pzem(pzem_request: PzemRequest, db: Session = Depends(get_db)):
         "power_factor": pzem.power_factor
     }
 
+@router.post("/bulk", status_code=status.HTTP_200_OK)
+async def create_pzem_bulk(request: Request, db: Session = Depends(get_db)):
+    try:
+        items = ingest.parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return ingest.insert_bulk(Pzem, PzemBulkRequest, items, db)
+
 
 @router.get("/data_pzem", status_code=status.HTTP_200_OK)
-async def read_pzem_data(page: int = 1, db: Session = Depends(get_db)):
-    limit = 10
-    offset = (page - 1) * limit
-
-    pzem_records = (
-        db.query(Pzem)
-        .order_by(Pzem.timestamp.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-    total_records = db.query(Pzem).count()
-    total_pages = (total_records + limit - 1) // limit
+async def read_pzem_data(
+    page: int = 1,
+    limit: int = PAGE_SIZE,
+    cursor: Optional[str] = None,
+    device: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        pzem_records, meta = paginate(db, Pzem, page, limit, cursor, device_filter(Pzem, device))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
-        "page": page,
-        "total_pages": total_pages,
-        "total_records": total_records,
+        **meta,
         "data": [
             {
                 "id": record.id,
                 "timestamp": record.timestamp.strftime("%Y-%m-%d %H:%M"),
+                "device": record.device,
                 "voltage": record.voltage,
                 "current": record.current,
                 "power": record.power,
@@ -91,12 +113,103 @@ async def read_pzem_data(page: int = 1, db: Session = Depends(get_db)):
             for record in pzem_records
         ],
     }
-    
+
+@router.get("/aggregate", status_code=status.HTTP_200_OK)
+async def aggregate_pzem_data(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    points: Optional[int] = None,
+    device: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return aggregate(db, Pzem, start, end, bucket, fields, points, device)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/data_pzem_aggregate", status_code=status.HTTP_200_OK)
+async def read_pzem_aggregates(
+    page: int = 1,
+    limit: int = PAGE_SIZE,
+    cursor: Optional[str] = None,
+    device: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        records, meta = paginate(db, PzemAggregate, page, limit, cursor, device_filter(PzemAggregate, device))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {
+        **meta,
+        "data": [
+            {
+                "id": record.id,
+                "timestamp": record.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                "device": record.device,
+                "interval_start": record.interval_start.strftime("%Y-%m-%d %H:%M:%S") if record.interval_start else None,
+                "samples": record.samples,
+                "missed": record.missed,
+                **{
+                    f"{field}_{stat}": getattr(record, f"{field}_{stat}")
+                    for field in FIELDS for stat in ("min", "max", "mean", "last")
+                },
+                "energy": record.energy,
+                "frequency": record.frequency
+            }
+            for record in records
+        ]
+    }
+
+@router.get("/events", status_code=status.HTTP_200_OK)
+async def read_pzem_events(
+    page: int = 1,
+    limit: int = PAGE_SIZE,
+    cursor: Optional[str] = None,
+    device: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        records, meta = paginate(db, PzemEvent, page, limit, cursor, device_filter(PzemEvent, device))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return {
+        **meta,
+        "data": [
+            {
+                "id": record.id,
+                "timestamp": record.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                "device": record.device,
+                "kind": record.kind,
+                "duration": record.duration,
+                "value": record.value,
+                "baseline": record.baseline
+            }
+            for record in records
+        ]
+    }
+
+@router.get("/poller", status_code=status.HTTP_200_OK)
+async def get_poller_status():
+    return pzem_poller.status()
+
+@router.get("/devices", status_code=status.HTTP_200_OK)
+async def get_pzem_devices():
+    return [
+        {"name": device.name, "slave_id": device.slave_id, "port": device.port, "timeout": device.timeout}
+        for device in pzem_sensor.PZEM_DEVICES.values()
+    ]
+
 @router.get("/reset_energy", status_code=status.HTTP_200_OK)
-async def reset_pzem_energy():
+async def reset_pzem_energy(device: Optional[str] = None):
     try:
-        pzem_sensor.reset_energy_counter()
+        await asyncio.to_thread(pzem_sensor.reset_energy_counter, device)
         return {"message": "Energy reset successfully"}
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.args[0])
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
@@ -113,7 +226,9 @@ async def update_pzem(pzem_id: int, pzem_request: PzemRequest, db: Session = Dep
         pzem.energy = pzem_request.energy
         pzem.power_factor = pzem_request.power_factor
         pzem.frequency = pzem_request.frequency
+        rollup.refresh(db, Pzem, pzem.timestamp)
         db.commit()
+        state_store.invalidate(Pzem)
         return pzem
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -126,7 +241,9 @@ async def delete_pzem(pzem_id: int, db: Session = Depends(get_db)):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pzem not found")
         
         db.delete(pzem)
+        rollup.refresh(db, Pzem, pzem.timestamp)
         db.commit()
+        state_store.invalidate(Pzem)
         return {"message": "Pzem data deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
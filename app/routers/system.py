@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+from starlette import status
+
+from ..service import retention
+from ..service.write_buffer import write_buffer
+from ..utils.import_profile import startup_report
+from ..utils.ttl_cache import cache_status
+from ..utils.state_store import state_store
+from ..utils.pipeline import pipeline
+
+router = APIRouter(
+    prefix="/system",
+    tags=["system"],
+)
+
+@router.get("/write-buffer", status_code=status.HTTP_200_OK)
+async def get_write_buffer_status():
+    return write_buffer.status()
+
+@router.get("/retention", status_code=status.HTTP_200_OK)
+async def get_retention_status():
+    return retention.status()
+
+@router.get("/pipeline", status_code=status.HTTP_200_OK)
+async def get_pipeline_status():
+    return pipeline.status()
+
+@router.get("/state", status_code=status.HTTP_200_OK)
+async def get_state_snapshot():
+    return {**state_store.snapshot(), "store": state_store.status()}
+
+@router.get("/caches", status_code=status.HTTP_200_OK)
+async def get_cache_status():
+    return cache_status()
+
+@router.get("/modbus", status_code=status.HTTP_200_OK)
+async def get_modbus_status():
+    from ..utils.modbus_manager import modbus_sessions
+    return modbus_sessions.status()
+
+# Camera modules are imported on request so this router works with ENABLE_CAMERA=0
+@router.get("/detector", status_code=status.HTTP_200_OK)
+async def get_detector_status():
+    from ..service import web_cam
+    from ..utils.detector_manager import people_detector
+
+    return {
+        **people_detector.status(),
+        "motion_gate": web_cam.motion_gate_status(),
+    }
+
+@router.get("/stream", status_code=status.HTTP_200_OK)
+async def get_stream_status():
+    from ..utils.mjpeg_broadcaster import broadcaster_status
+
+    return broadcaster_status()
+
+@router.get("/import-profile", status_code=status.HTTP_200_OK)
+async def get_import_profile():
+    return {"startup_imports": startup_report()}
@@ -1,22 +1,24 @@
 from sqlalchemy.orm import Session
 from ..models import DataAnalysis
 from datetime import datetime
+from ..utils.state_store import state_store
 
 def update_tset(tset: int, db: Session):
     if not (17 <= tset <= 21):
         raise ValueError("T_set must be between 17 and 21°C.")
 
+    # The row is modified, so it has to come from the session rather than the state store
     latest = db.query(DataAnalysis).order_by(DataAnalysis.timestamp.desc()).first()
     if not latest:
-        db.add(DataAnalysis(ac_temperature=tset, timestamp=datetime.now()))
-        db.commit()
-        return tset
-
-    latest.ac_temperature = tset
-    latest.timestamp = datetime.now()
+        latest = DataAnalysis(ac_temperature=tset, timestamp=datetime.now())
+        db.add(latest)
+    else:
+        latest.ac_temperature = tset
+        latest.timestamp = datetime.now()
     db.commit()
+    state_store.record(DataAnalysis, latest)
     return tset
 
 def get_last_tset(db: Session):
-    latest = db.query(DataAnalysis).order_by(DataAnalysis.timestamp.desc()).first()
+    latest = state_store.latest(db, DataAnalysis)
     return latest.ac_temperature if latest and latest.ac_temperature else 21
@@ -0,0 +1,175 @@
+import os
+import json
+import httpx
+from datetime import datetime
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from ..database import Sessionlocal
+from ..models import Pzem, AHT10, Camera, OpenWeather
+from . import rollup
+from .write_buffer import write_buffer
+from ..utils.state_store import state_store
+
+load_dotenv(override=True)
+
+# "local"  -> readings are written straight to the database (default)
+# "remote" -> readings are POSTed to the collector running at IP_SERVER
+INGEST_MODE = os.environ.get("INGEST_MODE", "local").lower()
+REMOTE_URL = f"http://{os.environ.get('IP_SERVER')}:8000"
+
+# Upper bound for a single /bulk request
+BULK_MAX_ROWS = int(os.environ.get("BULK_MAX_ROWS", 5000))
+
+ENDPOINTS = {
+    Pzem: "/pzem/create",
+    AHT10: "/aht10/create",
+    Camera: "/camera/create",
+    OpenWeather: "/openweather/create",
+}
+
+def insert_reading(model, data: dict, db: Session = None):
+    """Insert one reading and return the stored row.
+
+    When no session is given a short-lived one is opened, and the returned
+    row is detached from it so its columns can still be read afterwards.
+    """
+    own_session = db is None
+    if own_session:
+        db = Sessionlocal()
+
+    try:
+        record = model(**data)
+        db.add(record)
+        db.flush()  # applies the timestamp default
+        rollup.apply(db, model, [record])
+        db.commit()
+        db.refresh(record)
+        state_store.record(model, record)
+        if own_session:
+            db.expunge(record)
+        return record
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if own_session:
+            db.close()
+
+async def post_reading(model, data: dict):
+    """Forward one reading to the remote collector."""
+    if not os.environ.get("IP_SERVER"):
+        raise RuntimeError("INGEST_MODE=remote requires IP_SERVER to be set")
+
+    async with httpx.AsyncClient() as client:
+        response = await client.post(REMOTE_URL + ENDPOINTS[model], json=data)
+        response.raise_for_status()
+        return response.json()
+
+async def submit_reading(model, data: dict, db: Session = None):
+    """Queue one reading on the write-behind buffer, or insert it right away
+    when the buffer is not running.
+
+    Queued rows are stamped on arrival and returned unsaved, so `id` is None
+    until the next flush. Raises BufferFull when the queue stays full.
+    """
+    if not write_buffer.running:
+        return insert_reading(model, data, db)
+
+    row = dict(data)
+    if row.get("timestamp") is None:
+        row["timestamp"] = datetime.now()
+    await write_buffer.put(model, row)
+    state_store.record(model, row)
+    return model(**row)
+
+async def store_reading(model, data: dict):
+    """Entry point used by the scheduler services."""
+    if INGEST_MODE == "remote":
+        return await post_reading(model, data)
+    return await submit_reading(model, data)
+
+def parse_bulk_body(raw: bytes, content_type: str = "") -> list:
+    """Decode a /bulk payload, either a JSON array or NDJSON (one object per line).
+
+    A malformed NDJSON line does not reject the whole batch: it is kept in the
+    list as the decode error so it can be reported against its row.
+    """
+    text = raw.decode("utf-8")
+
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(e)
+    else:
+        try:
+            items = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON body: {e}")
+        if not isinstance(items, list):
+            raise ValueError("Body must be a JSON array of readings")
+
+    if len(items) > BULK_MAX_ROWS:
+        raise ValueError(f"Too many rows in one request (max {BULK_MAX_ROWS})")
+    return items
+
+def insert_bulk(model, schema, items: list, db: Session):
+    """Validate every item against `schema` and insert the valid ones.
+
+    All valid rows go in with a single executemany in one transaction. Rows
+    without a client-side timestamp get the time of arrival.
+    """
+    now = datetime.now()
+    rows = []
+    results = []
+
+    for index, item in enumerate(items):
+        if isinstance(item, Exception):
+            results.append({"index": index, "status": "error", "detail": [f"Invalid JSON: {item}"]})
+            continue
+        try:
+            reading = schema.model_validate(item)
+        except ValidationError as e:
+            results.append({
+                "index": index,
+                "status": "error",
+                "detail": [f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()],
+            })
+            continue
+
+        row = reading.model_dump()
+        if row.get("timestamp") is None:
+            row["timestamp"] = now
+        rows.append(row)
+        results.append({"index": index, "status": "created"})
+
+    if rows:
+        try:
+            db.execute(insert(model), rows)
+            rollup.apply(db, model, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        # The newest row of each stream (one per device for pzem)
+        newest = {}
+        for row in rows:
+            device = row.get("device")
+            if device not in newest or row["timestamp"] >= newest[device]["timestamp"]:
+                newest[device] = row
+        for row in newest.values():
+            state_store.record(model, row)
+
+    return {
+        "received": len(items),
+        "created": len(rows),
+        "failed": len(items) - len(rows),
+        "results": results,
+    }
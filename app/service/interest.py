@@ -1,5 +1,6 @@
 from ..models import Pzem, AHT10, Camera, OpenWeather, DataAnalysis
 from ..database import Sessionlocal
+from ..utils.state_store import state_store
 from fastapi import Depends
 from sqlalchemy.orm import Session
 from .ac_temp import get_last_tset  # ✅ Import from your T_set service
@@ -16,10 +17,10 @@ def get_interest_data(db: Session = Depends(get_db)):
         db = next(get_db())
 
         latest_data = {
-            "pzem": db.query(Pzem).order_by(Pzem.timestamp.desc()).first(),
-            "aht": db.query(AHT10).order_by(AHT10.timestamp.desc()).first(),
-            "camera": db.query(Camera).order_by(Camera.timestamp.desc()).first(),
-            "openweather": db.query(OpenWeather).order_by(OpenWeather.timestamp.desc()).first()
+            "pzem": state_store.latest(db, Pzem),
+            "aht": state_store.latest(db, AHT10),
+            "camera": state_store.latest(db, Camera),
+            "openweather": state_store.latest(db, OpenWeather)
         }
 
         # ✅ Get the most recent T_set value from the DB
@@ -38,8 +39,10 @@ def get_interest_data(db: Session = Depends(get_db)):
 
         db.add(interest_data)
         db.commit()
+        state_store.record(DataAnalysis, interest_data)
 
         print("✅ Interest data stored successfully")
 
     except Exception as e:
         print(f"❌ Failed to store data: {e}")
+        raise  # let the pipeline record the failure and hold back the dependents
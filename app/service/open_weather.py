@@ -1,10 +1,8 @@
 import httpx
-import os
-from dotenv import load_dotenv
+from sqlalchemy.exc import SQLAlchemyError
 
-load_dotenv(override=True)
-
-api_url = f"http://{os.environ.get('IP_SERVER')}:8000/openweather/create"
+from ..models import OpenWeather
+from . import ingest
 
 async def get_weather(api_key, lat, lon):
     async with httpx.AsyncClient() as client:
@@ -32,12 +30,12 @@ async def get_weather(api_key, lat, lon):
 
         except httpx.HTTPStatusError as e:
             print(f"Failed to retrieve data: {e}")
+            raise
 
 async def store_data(data):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(api_url, json=data)
-            response.raise_for_status()
-            print("OpenWeather data stored successfully")
-        except httpx.HTTPStatusError as e:
-            print(f"OpenWeather failed to store data: {e}")
\ No newline at end of file
+    try:
+        await ingest.store_reading(OpenWeather, data)
+        print("OpenWeather data stored successfully")
+    except (httpx.HTTPError, SQLAlchemyError, RuntimeError) as e:
+        print(f"OpenWeather failed to store data: {e}")
+        raise
\ No newline at end of file
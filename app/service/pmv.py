@@ -1,9 +1,10 @@
 from sqlalchemy.orm import Session
 from datetime import datetime
-from pythermalcomfort.models import pmv_ppd_ashrae
 from fastapi import Depends
 from ..models import DataAnalysis, PMVLog
 from ..database import Sessionlocal
+from . import rollup
+from ..utils.state_store import state_store
 
 def get_db():
     db = Sessionlocal()
@@ -12,10 +13,16 @@ def get_db():
     finally:
         db.close()
 
+def load_model():
+    """Import pythermalcomfort (slow, pulls in numba/scipy) ahead of the first PMV run."""
+    from pythermalcomfort.models import pmv_ppd_ashrae
+    return pmv_ppd_ashrae
+
 def calculate_and_log_pmv(db: Session = Depends(get_db)):
     try:
+        pmv_ppd_ashrae = load_model()
         db = next(get_db())
-        latest = db.query(DataAnalysis).order_by(DataAnalysis.timestamp.desc()).first()
+        latest = state_store.latest(db, DataAnalysis)
 
         met = 1.0
         clo = 0.61
@@ -50,7 +57,9 @@ def calculate_and_log_pmv(db: Session = Depends(get_db)):
         )
 
         db.add(log)
+        rollup.apply(db, PMVLog, [log])
         db.commit()
+        state_store.record(PMVLog, log)
 
         return {
             "timestamp": log.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
@@ -64,6 +73,7 @@ def calculate_and_log_pmv(db: Session = Depends(get_db)):
 
     except Exception as e:
         print(f"❌ Failed to store data: {e}")
+        raise
     
 def get_recent_pmv_logs(db: Session, limit: int = 50):
     records = db.query(PMVLog).order_by(PMVLog.timestamp.desc()).limit(limit).all()
@@ -0,0 +1,348 @@
+"""Continuous high-frequency PZEM polling (PZEM_POLLING=1).
+
+The meter is read PZEM_POLL_RATE times a second into fixed-size NumPy ring
+buffers. Every PZEM_AGGREGATE_INTERVAL seconds the interval is reduced to
+min/max/mean/last per quantity and stored as one PzemAggregate row, plus one
+ordinary Pzem row with the interval means, so the rest of the system
+(interest, emission, charts) sees a regular reading without the pzem table
+growing at the polling rate.
+
+Short excursions that the averages would hide (an AC compressor start, a
+voltage sag) are detected sample by sample and stored as PzemEvent rows.
+
+With several meters (PZEM_DEVICES) the bus is polled round-robin, one meter
+per slot, so every meter is sampled at PZEM_POLL_RATE. A meter that does not
+answer costs at most its own timeout (PZEM_<NAME>_TIMEOUT) per round.
+
+Rows that cannot be stored (e.g. the database is locked) are kept and retried
+on the next flush, up to PZEM_MAX_PENDING intervals' worth.
+"""
+import asyncio
+import math
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert
+
+from ..database import Sessionlocal
+from ..models import Pzem, PzemAggregate, PzemEvent
+from . import ingest
+from .pzem_sensor import PZEM_DEVICES, read_device
+
+PZEM_POLLING = os.environ.get("PZEM_POLLING", "0") == "1"
+PZEM_POLL_RATE = float(os.environ.get("PZEM_POLL_RATE", 1.0))  # samples per second
+PZEM_AGGREGATE_INTERVAL = float(os.environ.get("PZEM_AGGREGATE_INTERVAL", 60))  # seconds per stored row
+# A power sample this far above the recent median starts a spike
+PZEM_SPIKE_RATIO = float(os.environ.get("PZEM_SPIKE_RATIO", 0.5))  # +50%
+PZEM_SPIKE_MIN_WATTS = float(os.environ.get("PZEM_SPIKE_MIN_WATTS", 100))
+PZEM_EVENT_WINDOW = int(os.environ.get("PZEM_EVENT_WINDOW", 30))  # samples in the median baseline
+PZEM_VOLTAGE_MIN = float(os.environ.get("PZEM_VOLTAGE_MIN", 198))  # 220 V -10%
+PZEM_VOLTAGE_MAX = float(os.environ.get("PZEM_VOLTAGE_MAX", 242))  # 220 V +10%
+PZEM_MAX_PENDING = int(os.environ.get("PZEM_MAX_PENDING", 60))  # unstored intervals kept per meter
+
+FIELDS = ["voltage", "current", "power", "power_factor"]
+
+
+class RingBuffer:
+    """Fixed-size sample store; once full, new samples overwrite the oldest."""
+
+    def __init__(self, capacity, width):
+        self.data = np.empty((capacity, width))
+        self.index = 0
+        self.count = 0
+
+    def append(self, row):
+        self.data[self.index] = row
+        self.index = (self.index + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def values(self):
+        """The stored samples (in no particular order), as a view."""
+        return self.data[:self.count]
+
+    def clear(self):
+        self.index = self.count = 0
+
+
+class Excursion:
+    """An event in progress: when it started, its extreme value and the baseline."""
+
+    def __init__(self, kind, start, value, baseline):
+        self.kind = kind
+        self.start = start
+        self.peak = value
+        self.baseline = baseline
+
+
+class DeviceBuffer:
+    """Samples, running events and counters of one meter."""
+
+    def __init__(self, device, rate, interval):
+        self.device = device
+        # Room for one interval of samples, plus slack for timing jitter
+        self.samples = RingBuffer(math.ceil(rate * interval) + 10, len(FIELDS))
+        self.recent_power = RingBuffer(PZEM_EVENT_WINDOW, 1)
+
+        self.interval_start = datetime.now()
+        self.last_reading = None
+        self.missed = 0
+        self.excursions = {}  # kind -> Excursion
+        self.events = []  # finished pzem_event rows waiting for the next flush
+
+        self.total_samples = 0
+        self.total_missed = 0
+        self.last_error = None
+
+    def add(self, reading, now):
+        self.samples.append([reading[field] for field in FIELDS])
+        self.last_reading = reading
+        self.total_samples += 1
+        self._detect(reading, now)
+
+    def miss(self, error):
+        self.missed += 1
+        self.total_missed += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def _detect(self, reading, now):
+        """Open/close excursions for this sample. The power baseline is the
+        median of the last PZEM_EVENT_WINDOW samples, so a lasting step (the
+        AC staying on) ends its spike once it fills half the window."""
+        power, voltage = reading["power"], reading["voltage"]
+        recent = self.recent_power.values()
+        baseline = float(np.median(recent)) if len(recent) else None
+
+        spiking = (
+            baseline is not None
+            and power >= baseline * (1 + PZEM_SPIKE_RATIO)
+            and power - baseline >= PZEM_SPIKE_MIN_WATTS
+        )
+        self._track("power_spike", spiking, power, baseline, now, max)
+        self.recent_power.append([power])
+
+        self._track("voltage_sag", voltage < PZEM_VOLTAGE_MIN, voltage, PZEM_VOLTAGE_MIN, now, min)
+        self._track("voltage_swell", voltage > PZEM_VOLTAGE_MAX, voltage, PZEM_VOLTAGE_MAX, now, max)
+
+    def _track(self, kind, active, value, baseline, now, extreme):
+        excursion = self.excursions.get(kind)
+        if active:
+            if excursion is None:
+                self.excursions[kind] = Excursion(kind, now, value, baseline)
+            else:
+                excursion.peak = extreme(excursion.peak, value)
+        elif excursion is not None:
+            self._finish(kind, now)
+
+    def _finish(self, kind, now):
+        excursion = self.excursions.pop(kind)
+        self.events.append({
+            "timestamp": excursion.start,
+            "device": self.device.name,
+            "kind": kind,
+            "duration": (now - excursion.start).total_seconds(),
+            "value": excursion.peak,
+            "baseline": excursion.baseline,
+        })
+
+    def close_excursions(self, now):
+        """End the events still in progress (polling stops)."""
+        for kind in list(self.excursions):
+            self._finish(kind, now)
+
+    def summarise(self, now):
+        """Reduce the current interval to a pzem_aggregate row (None if no
+        sample was read) and start the next one."""
+        values = self.samples.values()
+        aggregate = None
+        if len(values):
+            aggregate = {
+                "timestamp": now,
+                "device": self.device.name,
+                "interval_start": self.interval_start,
+                "samples": len(values),
+                "missed": self.missed,
+                "energy": self.last_reading["energy"],
+                "frequency": self.last_reading["frequency"],
+            }
+            minimum, maximum, mean = values.min(axis=0), values.max(axis=0), values.mean(axis=0)
+            for i, field in enumerate(FIELDS):
+                aggregate[f"{field}_min"] = float(minimum[i])
+                aggregate[f"{field}_max"] = float(maximum[i])
+                aggregate[f"{field}_mean"] = float(mean[i])
+                aggregate[f"{field}_last"] = self.last_reading[field]
+
+        self.samples.clear()
+        self.missed = 0
+        self.interval_start = now
+        return aggregate
+
+    def status(self):
+        return {
+            "slave_id": self.device.slave_id,
+            "buffered_samples": self.samples.count,
+            "open_events": sorted(self.excursions),
+            "pending_events": len(self.events),
+            "total_samples": self.total_samples,
+            "total_missed": self.total_missed,
+            "last_reading": self.last_reading,
+            "last_error": self.last_error,
+        }
+
+
+class PzemPoller:
+    def __init__(self, devices=PZEM_DEVICES, rate=PZEM_POLL_RATE, interval=PZEM_AGGREGATE_INTERVAL):
+        self.rate = rate
+        self.interval = interval
+        self.buffers = [DeviceBuffer(device, rate, interval) for device in devices.values()]
+        self.task = None
+        self.flushes = 0
+        self.last_error = None
+        # Rows not stored yet, oldest first
+        self.aggregates, self.events, self.readings = [], [], []
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if not self.running:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling and store the partial interval and the open events."""
+        if not self.running:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        now = datetime.now()
+        for buffer in self.buffers:
+            buffer.close_excursions(now)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"PZEM poller failed to store the last interval: {e}")
+
+    async def _run(self):
+        # One slot per meter per sampling period
+        slot = 1 / (self.rate * len(self.buffers))
+        now = datetime.now()
+        for buffer in self.buffers:
+            buffer.interval_start = now
+        next_slot = time.monotonic()
+        flush_at = next_slot + self.interval
+        turn = 0
+
+        while True:
+            buffer = self.buffers[turn]
+            turn = (turn + 1) % len(self.buffers)
+            try:
+                reading = await read_device(buffer.device)
+            except Exception as e:
+                buffer.miss(e)
+            else:
+                buffer.add(reading, datetime.now())
+
+            if time.monotonic() >= flush_at:
+                flush_at += self.interval
+                try:
+                    await self.flush()
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    print(f"PZEM poller failed to store interval: {e}")
+
+            next_slot += slot
+            delay = next_slot - time.monotonic()
+            if delay < -slot:
+                next_slot = time.monotonic()  # fell behind (slow bus); don't burst to catch up
+            await asyncio.sleep(max(delay, 0))
+
+    async def flush(self):
+        """Store the interval of every meter, plus whatever an earlier flush
+        could not store. The pzem readings are stored even when the
+        aggregates/events fail, and the other way round; raises the first error."""
+        now = datetime.now()
+        for buffer in self.buffers:
+            aggregate = buffer.summarise(now)
+            self.events += buffer.events
+            buffer.events = []
+            if aggregate is None:
+                continue
+            self.aggregates.append(aggregate)
+            # The regular reading for this interval
+            self.readings.append({
+                "device": aggregate["device"],
+                "voltage": aggregate["voltage_mean"],
+                "current": aggregate["current_mean"],
+                "power": aggregate["power_mean"],
+                "energy": aggregate["energy"],
+                "frequency": aggregate["frequency"],
+                "power_factor": aggregate["power_factor_mean"],
+            })
+        self._limit_pending()
+
+        error = None
+        if self.aggregates or self.events:
+            try:
+                await asyncio.to_thread(_write, self.aggregates, self.events)
+            except Exception as e:
+                error = e
+            else:
+                self.aggregates, self.events = [], []
+                self.flushes += 1
+
+        while self.readings:
+            try:
+                await ingest.store_reading(Pzem, self.readings[0])
+            except Exception as e:
+                error = error or e
+                break
+            self.readings.pop(0)
+
+        if error is not None:
+            raise error
+
+    def _limit_pending(self):
+        """Drop the oldest unstored rows beyond PZEM_MAX_PENDING intervals per meter."""
+        limit = PZEM_MAX_PENDING * len(self.buffers)
+        for rows in (self.aggregates, self.events, self.readings):
+            excess = len(rows) - limit
+            if excess > 0:
+                del rows[:excess]
+                self.dropped += excess
+                print(f"PZEM poller dropped {excess} unstored rows")
+
+    def status(self):
+        return {
+            "running": self.running,
+            "rate": self.rate,
+            "interval": self.interval,
+            "flushes": self.flushes,
+            "pending_rows": len(self.aggregates) + len(self.events) + len(self.readings),
+            "dropped_rows": self.dropped,
+            "last_error": self.last_error,
+            "devices": {buffer.device.name: buffer.status() for buffer in self.buffers},
+        }
+
+
+def _write(aggregates, events):
+    db = Sessionlocal()
+    try:
+        if aggregates:
+            db.execute(insert(PzemAggregate), aggregates)
+        if events:
+            db.execute(insert(PzemEvent), events)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+pzem_poller = PzemPoller()
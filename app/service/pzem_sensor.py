@@ -1,111 +1,114 @@
-import modbus_tk.modbus_rtu as modbus_rtu
-import serial
-import time
-import struct
-from modbus_tk import defines as cst 
-import httpx
+import argparse
+import asyncio
 import os
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
 
-# Konfigurasi port serial
-PORT = "/dev/ttyUSB0"  # Ganti dengan port USB-TTL Anda
-api_url = f"http://{os.environ.get('IP_SERVER')}:8000/pzem/create"
+from modbus_tk import defines as cst
+import httpx
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models import Pzem, PRIMARY_DEVICE
+from ..utils.modbus_manager import modbus_sessions
+from . import ingest
+
+SLAVE_ID = int(os.environ.get("PZEM_SLAVE_ID", "1"), 0)  # Default slave ID dari PZEM-004T
+RESET_ENERGY = 0x42  # PZEM-specific reset function
+PZEM_TIMEOUT = float(os.environ.get("PZEM_TIMEOUT", 0.5))  # seconds a meter gets to answer
+
+class PzemDevice:
+    def __init__(self, name, slave_id, port=None, timeout=PZEM_TIMEOUT):
+        self.name = name
+        self.slave_id = slave_id
+        self.port = port  # None = MODBUS_PORT
+        self.timeout = timeout
+
+    def session(self):
+        return modbus_sessions.get(self.port)
+
+def parse_devices(config):
+    """Comma separated name:slave_id[@port] entries, e.g. "main:1,lighting:2,lab:1@/dev/ttyUSB1".
+    Per device timeouts come from PZEM_<NAME>_TIMEOUT."""
+    devices = {}
+    for entry in config.split(","):
+        name, _, address = entry.strip().partition(":")
+        slave_id, _, port = address.partition("@")
+        timeout = float(os.environ.get(f"PZEM_{name.upper()}_TIMEOUT", PZEM_TIMEOUT))
+        devices[name] = PzemDevice(name, int(slave_id, 0), port or None, timeout)
+    return devices
+
+# The meter named PRIMARY_DEVICE ("main") feeds interest, emission and the rollups
+PZEM_DEVICES = parse_devices(os.environ.get("PZEM_DEVICES", f"{PRIMARY_DEVICE}:{SLAVE_ID}"))
+
+def get_device(name=None):
+    name = name or PRIMARY_DEVICE
+    if name not in PZEM_DEVICES:
+        raise KeyError(f"Unknown PZEM device '{name}', expected one of {list(PZEM_DEVICES)}")
+    return PZEM_DEVICES[name]
+
+def parse_registers(data):
+    """Decode the 10 input registers of a PZEM-004T v3 (all read in one request)."""
+    return {
+        "voltage": data[0] / 10.0,
+        "current": (data[1] + (data[2] << 16)) / 1000.0,
+        "power": (data[3] + (data[4] << 16)) / 10.0,
+        "energy": data[5] + (data[6] << 16),
+        "frequency": data[7] / 10.0,
+        "power_factor": data[8] / 100.0
+    }
+
+async def read_device(device):
+    registers = await device.session().read(
+        device.slave_id, cst.READ_INPUT_REGISTERS, 0x0000, 10, timeout=device.timeout
+    )
+    return parse_registers(registers)
 
 async def read_pzem_data():
-    try:
-        # Membuka koneksi serial
-        serial_connection = serial.Serial(
-            port=PORT,
-            baudrate=9600,
-            bytesize=8,
-            parity='N',
-            stopbits=1,
-            timeout=1
-        )
+    """Read every registered meter in turn and store the readings. A meter
+    that does not answer within its timeout (or whose reading cannot be
+    stored) is skipped; fails only when no meter was stored."""
+    errors = []
+    for device in PZEM_DEVICES.values():
+        try:
+            reading = await read_device(device)
+            await store_data({**reading, "device": device.name})
+        except Exception as e:
+            errors.append(f"{device.name}: {type(e).__name__}: {e}")
 
-        # Membuat master Modbus RTU
-        master = modbus_rtu.RtuMaster(serial_connection)
-        master.set_timeout(2.0)
-        master.set_verbose(True)
-
-        # Membaca register dari PZEM-004T
-        slave_id = 0x01  # Default slave ID dari PZEM-004T
-        address = 0x0000
-        length = 10
-
-        data = master.execute(slave_id, cst.READ_INPUT_REGISTERS, address, length)
-
-        # Parsing data dari register
-        voltage = data[0] / 10.0
-        current = (data[1] + (data[2] << 16)) / 1000.0
-        power = (data[3] + (data[4] << 16)) / 10.0
-        energy = data[5] + (data[6] << 16)
-        frequency = data[7] / 10.0
-        power_factor = data[8] / 100.0
-
-        # Kirim data ke API
-        data_to_send = {
-            "voltage": voltage,
-            "current": current,
-            "power": power,
-            "energy": energy,
-            "frequency": frequency,
-            "power_factor": power_factor
-        }
-
-        await store_data(data_to_send)
-
-    except httpx.HTTPStatusError as e:
-        print(f"Failed to store data: {e}")
+    if errors:
+        if len(errors) == len(PZEM_DEVICES):
+            raise RuntimeError("; ".join(errors))
+        print(f"PZEM meters not stored: {'; '.join(errors)}")
 
 async def store_data(data):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(api_url, json=data)
-            response.raise_for_status()
-            print("PZEM data stored successfully")
-        except httpx.HTTPStatusError as e:
-            print(f"PZEM failed to store data: {e}")
-
-def calculate_crc(data):
-    """Calculate CRC-16 (Modbus standard)"""
-    crc = 0xFFFF
-    for pos in data:
-        crc ^= pos
-        for _ in range(8):
-            if crc & 0x0001:
-                crc >>= 1
-                crc ^= 0xA001
-            else:
-                crc >>= 1
-    return struct.pack('<H', crc)
-
-def reset_energy_counter():
     try:
-        serial_connection = serial.Serial(
-            port=PORT,
-            baudrate=9600,
-            bytesize=8,
-            parity='N',
-            stopbits=1,
-            timeout=1
+        await ingest.store_reading(Pzem, data)
+        print("PZEM data stored successfully")
+    except (httpx.HTTPError, SQLAlchemyError, RuntimeError) as e:
+        print(f"PZEM failed to store data: {e}")
+        raise
+
+def reset_energy_counter(device=None):
+    """Blocking; call it from a worker thread. Raises when the meter does not confirm."""
+    device = get_device(device)
+    response = device.session().send_raw(device.slave_id, RESET_ENERGY)
+    # The meter echoes the command on success
+    if len(response) < 2 or response[0] != device.slave_id or response[1] != RESET_ENERGY:
+        raise RuntimeError(
+            f"PZEM '{device.name}' did not confirm the energy reset (response {response.hex() or 'empty'})"
         )
+    print("Energy reset command sent.")
 
-        slave_id = 0x01
-        function_code = 0x42  # Reset function
-        reset_command = bytes([slave_id, function_code])  
-        reset_command += calculate_crc(reset_command)  # Add CRC
-
-        serial_connection.write(reset_command)
-        time.sleep(1)  # Give some time for the reset
-
-        print("Energy reset command sent.")
-
-    except Exception as e:
-        print("Error resetting energy:", e)
-
-    finally:
-        if 'serial_connection' in locals() and serial_connection.is_open:
-            serial_connection.close()
+async def read_all():
+    for device in PZEM_DEVICES.values():
+        try:
+            print(f"{device.name} (slave {device.slave_id}): {await read_device(device)}")
+        except Exception as e:
+            print(f"{device.name} (slave {device.slave_id}): {type(e).__name__}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the registered PZEM meters once, without storing.")
+    parser.add_argument("command", choices=["read"])
+    parser.parse_args()
+    asyncio.run(read_all())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Retention for the raw tables and the annotated snapshots.
+
+Rows older than their table's policy are deleted in small batches, one short
+transaction each, so the ingest path never waits long for the write lock.
+Tables covered by rollups get their rollups rebuilt for the expiring range
+first, so the hourly/daily history outlives the raw rows. Afterwards freed
+pages are returned to the filesystem with an incremental VACUUM.
+
+Policies are days of raw data to keep; 0 keeps a table forever:
+
+    RETENTION_DAYS=90             default for the sensor tables
+    RETENTION_PZEM_DAYS=30        per table override (RETENTION_<TABLE>_DAYS)
+
+An existing database has to be converted once (a full VACUUM, the server
+should be stopped) before incremental VACUUM can work:
+
+    python -m app.service.retention enable-incremental-vacuum
+    python -m app.service.retention run
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select, text
+
+from ..database import Sessionlocal, engine
+from ..models import Pzem, AHT10, Camera, OpenWeather, DataAnalysis, EmissionLog, PMVLog, PzemAggregate, PzemEvent
+from . import rollup
+
+load_dotenv(override=True)
+
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", 90))
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", 2000))  # rows per DELETE
+RETENTION_BATCH_PAUSE = float(os.environ.get("RETENTION_BATCH_PAUSE", 0.05))  # seconds between batches
+RETENTION_VACUUM_PAGES = int(os.environ.get("RETENTION_VACUUM_PAGES", 0))  # 0 = all free pages
+RETENTION_IMAGES_DAYS = int(os.environ.get("RETENTION_IMAGES_DAYS", 7))
+IMAGE_DIRECTORIES = ["images/in", "images/out"]
+
+# Defaults per table; data_analysis is the model's retraining set and is kept
+DEFAULT_POLICIES = {
+    Pzem: RETENTION_DAYS,
+    AHT10: RETENTION_DAYS,
+    Camera: RETENTION_DAYS,
+    OpenWeather: RETENTION_DAYS,
+    DataAnalysis: 0,
+    EmissionLog: 365,
+    PMVLog: 365,
+    PzemAggregate: RETENTION_DAYS,
+    PzemEvent: 365,
+}
+
+POLICIES = {
+    model: int(os.environ.get(f"RETENTION_{model.__tablename__.upper()}_DAYS", days))
+    for model, days in DEFAULT_POLICIES.items()
+}
+
+last_report = None
+
+
+def prune_table(model, days, now=None):
+    """Delete the rows of `model` older than `days` (whole days only). Returns
+    the number of rows deleted."""
+    cutoff = rollup.bucket_of((now or datetime.now()) - timedelta(days=days), "day")
+
+    db = Sessionlocal()
+    try:
+        oldest = db.query(func.min(model.timestamp)).filter(model.timestamp < cutoff).scalar()
+        if oldest is None:
+            return 0
+        if model in rollup.METRICS:
+            # Catch up with any raw rows edited since they were rolled up
+            rollup.rebuild(db, since=oldest, until=cutoff, models=[model])
+            db.commit()
+
+        expired = (
+            select(model.id)
+            .where(model.timestamp < cutoff)
+            .order_by(model.timestamp)
+            .limit(RETENTION_BATCH_SIZE)
+            .scalar_subquery()
+        )
+        deleted = 0
+        while True:
+            count = db.execute(delete(model).where(model.id.in_(expired))).rowcount
+            db.commit()
+            deleted += count
+            if count < RETENTION_BATCH_SIZE:
+                return deleted
+            time.sleep(RETENTION_BATCH_PAUSE)  # let queued writers in
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def database_usage():
+    with engine.connect() as conn:
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        return {
+            "auto_vacuum": {0: "none", 1: "full", 2: "incremental"}.get(
+                conn.execute(text("PRAGMA auto_vacuum")).scalar()
+            ),
+            "size_bytes": conn.execute(text("PRAGMA page_count")).scalar() * page_size,
+            "free_bytes": conn.execute(text("PRAGMA freelist_count")).scalar() * page_size,
+        }
+
+
+def compact():
+    """Run an incremental VACUUM and report the space it gave back."""
+    if engine.dialect.name != "sqlite":
+        return None
+
+    before = database_usage()
+    if before["auto_vacuum"] == "incremental":
+        pages = f"({RETENTION_VACUUM_PAGES})" if RETENTION_VACUUM_PAGES > 0 else ""
+        with engine.connect() as conn:
+            # sqlite3's execute() steps the pragma once, freeing a single page;
+            # executescript() runs it to completion
+            conn.connection.driver_connection.executescript(f"PRAGMA incremental_vacuum{pages};")
+    after = database_usage()
+
+    report = {
+        **after,
+        "reclaimed_bytes": before["size_bytes"] - after["size_bytes"],
+    }
+    if before["auto_vacuum"] != "incremental":
+        report["note"] = "incremental VACUUM is off; run `python -m app.service.retention enable-incremental-vacuum`"
+    return report
+
+
+def enable_incremental_vacuum():
+    """One-off conversion of an existing database. Rewrites the whole file."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.commit()
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+
+
+def prune_images(days=RETENTION_IMAGES_DAYS, now=None):
+    """Delete snapshots older than `days`. Returns (files, bytes) removed."""
+    if days <= 0:
+        return 0, 0
+    cutoff = ((now or datetime.now()) - timedelta(days=days)).timestamp()
+    files = size = 0
+    for directory in IMAGE_DIRECTORIES:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    size += entry.stat().st_size
+                    os.unlink(entry.path)
+                    files += 1
+                except OSError as e:
+                    print(f"Failed to delete {entry.path}: {e}")
+    return files, size
+
+
+def run():
+    """Apply every policy, prune old snapshots and compact the database.
+    Blocking; the scheduler calls it in a worker thread."""
+    global last_report
+
+    start = time.perf_counter()
+    now = datetime.now()
+    deleted = {}
+    for model, days in POLICIES.items():
+        if days > 0:
+            deleted[model.__tablename__] = prune_table(model, days, now)
+
+    files, image_bytes = prune_images(now=now)
+    last_report = {
+        "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "deleted_rows": deleted,
+        "deleted_images": files,
+        "deleted_image_bytes": image_bytes,
+        "database": compact(),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(f"Retention: {last_report}")
+    return last_report
+
+
+def status():
+    return {
+        "policies_days": {model.__tablename__: days for model, days in POLICIES.items()},
+        "images_days": RETENTION_IMAGES_DAYS,
+        "last_run": last_report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the data retention policies.")
+    parser.add_argument("command", choices=["run", "enable-incremental-vacuum"])
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run()
+    else:
+        enable_incremental_vacuum()
+        print(f"Database usage: {database_usage()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Hourly and daily rollups of the sensor and log tables.
+
+apply() runs in the same transaction as every insert (single readings, /bulk,
+the write-behind buffer, the emission and PMV logs) and upserts the buckets
+the new rows fall in, so status and chart queries never have to scan the raw
+tables. Of the PZEM meters, only the primary one ("main") is rolled up.
+
+The update/delete endpoints refresh the buckets of the row they change;
+anything else that edits raw rows has to be followed by a rebuild():
+
+    python -m app.service.rollup backfill [--since 2025-01-01]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, delete, func, true
+
+from ..database import Sessionlocal
+from ..models import Pzem, AHT10, Camera, OpenWeather, EmissionLog, PMVLog, Rollup, PRIMARY_DEVICE
+from ..utils.aggregation import bucket_stats, from_epoch
+
+# model -> {metric name: column}
+METRICS = {
+    Pzem: {"power": "power", "energy": "energy"},
+    AHT10: {"indoor_temperature": "temperature", "indoor_humidity": "humidity"},
+    OpenWeather: {"outdoor_temperature": "temperature", "outdoor_humidity": "humidity"},
+    Camera: {"occupancy": "occupant"},
+    EmissionLog: {"emission": "emission"},
+    PMVLog: {"pmv": "pmv"},
+}
+
+PERIODS = {
+    "hour": 60 * 60,
+    "day": 24 * 60 * 60,
+}
+
+def bucket_of(timestamp: datetime, period: str) -> datetime:
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def metric_for(model, field):
+    """Name of the rollup metric for a model column, or None if it has none."""
+    for metric, column in METRICS.get(model, {}).items():
+        if column == field:
+            return metric
+    return None
+
+def _value(row, column):
+    return row.get(column) if isinstance(row, dict) else getattr(row, column)
+
+def _rolled_up(model, row):
+    """Rows of other devices than the primary one stay out of the rollups."""
+    return not hasattr(model, "device") or _value(row, "device") in (None, PRIMARY_DEVICE)
+
+def apply(db, model, rows):
+    """Fold new rows (dicts or ORM objects with a timestamp) into the rollups.
+    Does not commit; call it before the commit of the insert itself."""
+    metrics = METRICS.get(model)
+    rows = [row for row in rows if _rolled_up(model, row)]
+    if not metrics or not rows:
+        return
+
+    buckets = {}
+    for row in rows:
+        timestamp = _value(row, "timestamp")
+        for metric, column in metrics.items():
+            value = _value(row, column)
+            if value is None:
+                continue
+            for period in PERIODS:
+                key = (period, metric, bucket_of(timestamp, period))
+                entry = buckets.get(key)
+                if entry is None:
+                    buckets[key] = {
+                        "period": period, "metric": metric, "bucket": key[2],
+                        "count": 1, "total": value, "minimum": value, "maximum": value,
+                        "last": value, "last_timestamp": timestamp,
+                    }
+                    continue
+                entry["count"] += 1
+                entry["total"] += value
+                entry["minimum"] = min(entry["minimum"], value)
+                entry["maximum"] = max(entry["maximum"], value)
+                if timestamp >= entry["last_timestamp"]:
+                    entry["last"], entry["last_timestamp"] = value, timestamp
+
+    if buckets:
+        _upsert(db, list(buckets.values()))
+
+def check_dialect(bind):
+    """The upserts need ON CONFLICT; call once at startup so an unsupported
+    DATABASE_URL fails there rather than on every insert."""
+    if bind.dialect.name not in ("sqlite", "postgresql"):
+        raise RuntimeError(f"Rollups need SQLite or PostgreSQL, not {bind.dialect.name}")
+
+def _upsert(db, rows):
+    # Dialect checked at startup (check_dialect)
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        smaller, larger = func.least, func.greatest
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        smaller, larger = func.min, func.max
+
+    table = Rollup.__table__
+    statement = insert(table)
+    new = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=["period", "metric", "bucket"],
+        set_={
+            "count": table.c.count + new.count,
+            "total": table.c.total + new.total,
+            "minimum": smaller(table.c.minimum, new.minimum),
+            "maximum": larger(table.c.maximum, new.maximum),
+            "last": case((new.last_timestamp >= table.c.last_timestamp, new.last), else_=table.c.last),
+            "last_timestamp": larger(table.c.last_timestamp, new.last_timestamp),
+        },
+    )
+    db.execute(statement, rows)
+
+def rebuild(db, since: datetime = None, until: datetime = None, models=None):
+    """Recompute the rollups from the raw tables for every bucket that starts
+    at or after `since` and before `until`. Without `since` it starts at the
+    oldest raw row, so buckets whose rows retention already pruned are kept.
+    Does not commit. Returns the number of rollup rows written."""
+    written = 0
+    for model in models or METRICS:
+        metrics = METRICS[model]
+        source = model.device == PRIMARY_DEVICE if hasattr(model, "device") else true()
+        first = since or db.query(func.min(model.timestamp)).filter(source).scalar()
+        if first is None:
+            continue  # no raw rows (left) to rebuild from
+        for period, size in PERIODS.items():
+            start = bucket_of(first, period)
+            in_range = source & (model.timestamp >= start)
+            stale = (Rollup.period == period) & Rollup.metric.in_(list(metrics)) & (Rollup.bucket >= start)
+            if until:
+                in_range = in_range & (model.timestamp < until)
+                stale = stale & (Rollup.bucket < until)
+            db.execute(delete(Rollup).where(stale))
+
+            rows = []
+            for stats in bucket_stats(db, model, list(metrics.values()), in_range, size):
+                bucket = from_epoch(stats[0])
+                for i, metric in enumerate(metrics):
+                    count, low, high, total, last = stats[3 + i * 5: 8 + i * 5]
+                    if count:
+                        rows.append({
+                            "period": period, "metric": metric, "bucket": bucket,
+                            "count": count, "total": total, "minimum": low, "maximum": high,
+                            "last": last, "last_timestamp": stats[2],
+                        })
+            if rows:
+                _upsert(db, rows)
+            written += len(rows)
+    return written
+
+def refresh(db, model, timestamp: datetime):
+    """Rebuild the hour and day buckets holding `timestamp` after a row there
+    was edited or deleted. Flushes the session but does not commit."""
+    if model not in METRICS:
+        return 0
+    db.flush()
+    day = bucket_of(timestamp, "day")
+    return rebuild(db, since=day, until=day + timedelta(days=1), models=[model])
+
+def series(db, metric: str, period: str, start: datetime, end: datetime):
+    """Rollup rows of one metric whose bucket starts in [start, end), oldest first."""
+    return (
+        db.query(Rollup)
+        .filter(
+            Rollup.period == period,
+            Rollup.metric == metric,
+            Rollup.bucket >= bucket_of(start, period),
+            Rollup.bucket < end,
+        )
+        .order_by(Rollup.bucket)
+        .all()
+    )
+
+def day_total(db, metric: str, day: datetime) -> float:
+    total = db.query(Rollup.total).filter(
+        Rollup.period == "day",
+        Rollup.metric == metric,
+        Rollup.bucket == bucket_of(day, "day"),
+    ).scalar()
+    return total or 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the hourly/daily rollup table.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--since", type=datetime.fromisoformat, help="rebuild buckets from this date on (default: the oldest raw row)")
+    args = parser.parse_args()
+
+    db = Sessionlocal()
+    try:
+        written = rebuild(db, since=args.since)
+        db.commit()
+        print(f"Rebuilt {written} rollup rows")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
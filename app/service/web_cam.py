@@ -1,22 +1,30 @@
-from imageai.Detection import ObjectDetection
+import asyncio
 import cv2
 import os
+import time
 from datetime import datetime
-import warnings
 import httpx
-from ..utils.camera_manager import camera_stream
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
-
-warnings.filterwarnings("ignore", category=UserWarning, module="torchvision.models._utils")
-
-MODEL_PATH = "models/retinanet_resnet50_fpn_coco-eeacb38b.pth"
-MIN_PROBABILITY = 15
-
-api_url = f"http://{os.environ.get('IP_SERVER')}:8000/camera/create"
-
-execution_path = os.getcwd()
+from sqlalchemy.exc import SQLAlchemyError
+from ..utils.camera_manager import camera_registry
+from ..utils.detector_manager import people_detector
+from ..models import Camera
+from . import ingest
+
+# Annotated snapshots for the camera page. 0 disables them entirely.
+ANNOTATION_INTERVAL = float(os.environ.get("ANNOTATION_INTERVAL", 600))  # seconds
+ANNOTATION_JPEG_QUALITY = int(os.environ.get("ANNOTATION_JPEG_QUALITY", 80))
+ANNOTATION_KEEP = int(os.environ.get("ANNOTATION_KEEP", 5))  # snapshots kept per directory
+
+# Motion gate: reuse the previous count while the scene is static
+MOTION_THRESHOLD = float(os.environ.get("MOTION_THRESHOLD", 0.02))  # peak change score, 0..1
+MOTION_MAX_SKIPS = int(os.environ.get("MOTION_MAX_SKIPS", 6))  # force a detection after this many skips
+
+last_annotation = None
+last_count = None
+consecutive_skips = 0
+skipped_inferences = 0
+executed_inferences = 0
+annotation_tasks = set()  # snapshots being written; the loop only keeps weak references
 
 def ensure_directories():
     os.makedirs("images/in", exist_ok=True)
@@ -24,66 +32,119 @@ def ensure_directories():
 
 def generate_file_paths():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    input_path = f"images/in/input_frame_{timestamp}.png"
-    output_path = f"images/out/output_frame_{timestamp}.png"
+    input_path = f"images/in/input_frame_{timestamp}.jpg"
+    output_path = f"images/out/output_frame_{timestamp}.jpg"
     return input_path, output_path
 
-def clear_directory(directory):
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
+def prune_directory(directory, keep=ANNOTATION_KEEP):
+    """Delete all but the `keep` newest files in `directory`."""
+    files = [
+        os.path.join(directory, f) for f in os.listdir(directory)
+        if os.path.isfile(os.path.join(directory, f))
+    ]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for file_path in files[keep:]:
         try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.unlink(file_path)
+            os.unlink(file_path)
         except Exception as e:
             print('Failed to delete %s. Reason: %s' % (file_path, e))
 
-async def people_counter():
+def save_annotated_frame(frame, boxes):
+    """Write the raw and annotated frame as JPEG. Runs in a worker thread."""
+    try:
+        write_snapshots(frame, boxes)
+    except Exception as e:
+        print(f"Failed to save annotated frame: {e}")
+
+def write_snapshots(frame, boxes):
     ensure_directories()
-    clear_directory("images/in")
-    clear_directory("images/out")
+    input_path, output_path = generate_file_paths()
+    params = [cv2.IMWRITE_JPEG_QUALITY, ANNOTATION_JPEG_QUALITY]
+
+    cv2.imwrite(input_path, frame, params)
+
+    annotated = frame.copy()
+    for x1, y1, x2, y2, score in boxes:
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(annotated, f"person {score * 100:.0f}%", (x1, max(y1 - 6, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    cv2.imwrite(output_path, annotated, params)
+
+    prune_directory("images/in")
+    prune_directory("images/out")
+
+def motion_gate_status():
+    # A status request must not open the camera
+    camera_stream = camera_registry.peek()
+    return {
+        "enabled": camera_stream.motion_enabled if camera_stream else None,
+        "camera": "running" if camera_stream else "not started",
+        "threshold": MOTION_THRESHOLD,
+        "max_skips": MOTION_MAX_SKIPS,
+        "change_score": round(camera_stream.change_score, 4) if camera_stream else None,
+        "last_count": last_count,
+        "skipped_inferences": skipped_inferences,
+        "executed_inferences": executed_inferences,
+    }
+
+def scene_is_static():
+    """True when the scene has barely changed since the previous detection."""
+    camera_stream = camera_registry.get()
+    peak = camera_stream.take_peak_change()
+    return (
+        camera_stream.motion_enabled
+        and last_count is not None
+        and consecutive_skips < MOTION_MAX_SKIPS
+        and peak < MOTION_THRESHOLD
+    )
 
-    frame = camera_stream.get_frame()
-    if frame is None:
-        print("Failed to capture frame from camera")
-        return
-    
-    detector = ObjectDetection()
-    detector.useCPU = True
+async def people_counter():
+    global last_annotation, last_count, consecutive_skips, skipped_inferences, executed_inferences
+
+    camera_stream = camera_registry.get()  # opens the default camera on first use
 
-    if MODEL_PATH == "models/retinanet_resnet50_fpn_coco-eeacb38b.pth":
-        detector.setModelTypeAsRetinaNet()
-    elif MODEL_PATH == "models/yolov3.pt":
-        detector.setModelTypeAsYOLOv3()
-    elif MODEL_PATH == "models/yolov3-tiny.pt":
-        detector.setModelTypeAsYOLOv3_tiny()
+    if camera_stream.get_frame() is None:
+        raise RuntimeError("Failed to capture frame from camera")
+
+    if scene_is_static():
+        consecutive_skips += 1
+        skipped_inferences += 1
+        print(f"Scene unchanged, reusing last count: {last_count}")
+        await store_data(last_count)
+        return
 
-    detector.setModelPath(os.path.join(execution_path, MODEL_PATH))
-    detector.loadModel()
+    # Copy: the capture thread reuses its buffers while detection is running
+    frame = camera_stream.get_frame(copy=True)
 
     try:
-        input_path, output_path = generate_file_paths()
-        cv2.imwrite(input_path, frame)
-
-        custom = detector.CustomObjects(person=True)
-        detections = detector.detectObjectsFromImage(
-            input_image=input_path, 
-            output_image_path=output_path, 
-            minimum_percentage_probability=MIN_PROBABILITY, 
-            custom_objects=custom
-        )
-        num_people = len(detections)
+        boxes = await people_detector.run(frame)
+        num_people = len(boxes)
+        last_count = num_people
+        consecutive_skips = 0
+        executed_inferences += 1
         print(f"Number of people detected: {num_people}")
 
+        if ANNOTATION_INTERVAL > 0 and (
+            last_annotation is None or time.monotonic() - last_annotation >= ANNOTATION_INTERVAL
+        ):
+            last_annotation = time.monotonic()
+            task = asyncio.create_task(asyncio.to_thread(save_annotated_frame, frame, boxes))
+            annotation_tasks.add(task)
+            task.add_done_callback(annotation_tasks.discard)
+
         await store_data(num_people)
-    
+
+    except asyncio.TimeoutError:
+        print("Error: person detection timed out")
+        raise
     except Exception as e:
         print(f"Error: {e}")
+        raise
 
 async def store_data(num_people):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(api_url, json={"occupant": num_people})
-            response.raise_for_status()
-            print("WebCam data stored successfully")
-        except httpx.HTTPStatusError as e:
-            print(f"WebCam failed to store data: {e}")
\ No newline at end of file
+    try:
+        await ingest.store_reading(Camera, {"occupant": num_people})
+        print("WebCam data stored successfully")
+    except (httpx.HTTPError, SQLAlchemyError, RuntimeError) as e:
+        print(f"WebCam failed to store data: {e}")
+        raise
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import time
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from dotenv import load_dotenv
+
+from ..database import Sessionlocal
+from ..utils.state_store import state_store
+from . import rollup
+
+load_dotenv(override=True)
+
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "0") == "1"  # opt-in: queued rows have no id yet
+WRITE_BUFFER_MAX_ROWS = int(os.environ.get("WRITE_BUFFER_MAX_ROWS", 10000))
+WRITE_BUFFER_BATCH_SIZE = int(os.environ.get("WRITE_BUFFER_BATCH_SIZE", 500))
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.environ.get("WRITE_BUFFER_FLUSH_INTERVAL", 1.0))  # seconds
+WRITE_BUFFER_PUT_TIMEOUT = float(os.environ.get("WRITE_BUFFER_PUT_TIMEOUT", 2.0))  # seconds
+# A batch failing with OperationalError (e.g. "database is locked") is retried
+WRITE_BUFFER_RETRIES = int(os.environ.get("WRITE_BUFFER_RETRIES", 2))
+WRITE_BUFFER_RETRY_DELAY = float(os.environ.get("WRITE_BUFFER_RETRY_DELAY", 0.5))  # seconds, grows per attempt
+
+class BufferFull(RuntimeError):
+    """Raised when the queue stays full for longer than the put timeout."""
+
+class WriteBuffer:
+    """Bounded write-behind queue for sensor inserts.
+
+    Readings are queued by the request handlers and written by a background
+    task in batches, one transaction per flush, so the SQLite commit happens
+    off the request path. A flush is triggered when `batch_size` rows are
+    waiting or `flush_interval` seconds have passed since the first one.
+
+    A batch that cannot be committed is retried while the error looks
+    transient, then written row by row so only the offending rows are lost.
+    """
+
+    def __init__(self, max_rows, batch_size, flush_interval):
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.task = None
+        self._collecting = []
+
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.rejected_rows = 0
+        self.last_flush_seconds = None
+        self.last_error = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_rows)
+        self.task = asyncio.create_task(self._run())
+
+    async def put(self, model, row: dict, timeout: float = WRITE_BUFFER_PUT_TIMEOUT):
+        """Queue one row, waiting up to `timeout` seconds for free space."""
+        try:
+            await asyncio.wait_for(self.queue.put((model, row)), timeout)
+        except asyncio.TimeoutError:
+            self.rejected_rows += 1
+            raise BufferFull(f"Write buffer is full ({self.max_rows} rows pending)")
+
+    async def flush(self):
+        """Wait until everything queued so far has been written."""
+        if not self.running:
+            return
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put((None, done))
+        await done
+
+    async def stop(self):
+        """Stop the background task and write whatever is still queued."""
+        if self.task is None:
+            return
+        await self.flush()
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+        # Rows picked up by a batch that had not been flushed yet, plus anything
+        # that arrived after the final flush() call.
+        leftover, waiters = self._drain(self.queue.qsize())
+        batch = self._collecting + leftover
+        self._collecting = []
+        await self._flush(batch, waiters)
+        print(f"✅ Write buffer drained ({self.flushed_rows} rows written)")
+
+    def status(self):
+        return {
+            "enabled": self.running,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "capacity": self.max_rows,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "failed_rows": self.failed_rows,
+            "rejected_rows": self.rejected_rows,
+            "last_flush_seconds": self.last_flush_seconds,
+            "last_error": self.last_error,
+        }
+
+    async def _run(self):
+        while True:
+            first = await self.queue.get()
+            batch, waiters = self._split([first])
+            self._collecting = batch
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size and not waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                more, more_waiters = self._split([item])
+                batch += more
+                waiters += more_waiters
+
+            self._collecting = []
+            await self._flush(batch, waiters)
+
+    def _drain(self, count):
+        items = []
+        for _ in range(count):
+            try:
+                items.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return self._split(items)
+
+    @staticmethod
+    def _split(items):
+        batch = [item for item in items if item[0] is not None]
+        waiters = [item[1] for item in items if item[0] is None]
+        return batch, waiters
+
+    async def _flush(self, batch, waiters):
+        if batch:
+            start = time.perf_counter()
+            failed = await self._write_with_retry(batch)
+            self.flushes += 1
+            self.flushed_rows += len(batch) - len(failed)
+            self.failed_rows += len(failed)
+            self.last_error = str(failed[-1][1]) if failed else None
+            if failed:
+                print(f"❌ Write buffer dropped {len(failed)} of {len(batch)} rows: {self.last_error}")
+                # The state store already serves the dropped rows as the latest readings
+                for model in {model for model, _ in failed}:
+                    state_store.invalidate(model)
+            self.last_flush_seconds = round(time.perf_counter() - start, 4)
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _write_with_retry(self, batch):
+        """Write the batch; returns the (model, error) of every row that was dropped."""
+        for attempt in range(WRITE_BUFFER_RETRIES + 1):
+            try:
+                await asyncio.to_thread(self._write, batch)
+                return []
+            except OperationalError as e:
+                print(f"❌ Write buffer flush failed (attempt {attempt + 1}): {e}")
+                if attempt < WRITE_BUFFER_RETRIES:
+                    await asyncio.sleep(WRITE_BUFFER_RETRY_DELAY * (attempt + 1))
+            except Exception as e:
+                print(f"❌ Write buffer flush failed: {e}")
+                break
+        # Isolate the rows that cannot be written
+        return await asyncio.to_thread(self._write_each, batch)
+
+    @staticmethod
+    def _write_each(batch):
+        """One transaction per row. Returns (model, error) for the rows that failed."""
+        failed = []
+        for model, row in batch:
+            db = Sessionlocal()
+            try:
+                db.execute(insert(model), [row])
+                rollup.apply(db, model, [row])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                failed.append((model, e))
+            finally:
+                db.close()
+        return failed
+
+    @staticmethod
+    def _write(batch):
+        # executemany needs the same columns in every row of a statement
+        groups = {}
+        for model, row in batch:
+            groups.setdefault((model, tuple(sorted(row))), []).append(row)
+
+        db = Sessionlocal()
+        try:
+            for (model, _), rows in groups.items():
+                db.execute(insert(model), rows)
+                rollup.apply(db, model, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+write_buffer = WriteBuffer(WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_BATCH_SIZE, WRITE_BUFFER_FLUSH_INTERVAL)
@@ -0,0 +1,213 @@
+"""Time-bucketed history for the charts.
+
+aggregate() groups the rows of a sensor/log table into fixed buckets
+(1m/5m/1h/1d) and returns min/max/avg/last of each numeric column per bucket,
+all in one SQL query on the timestamp index. With bucket="raw" the rows are
+returned as they are. Either result can be thinned to a target point count
+with LTTB (largest triangle three buckets), which keeps the visual shape of
+the series.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import Float, Integer, case, cast, func, select
+
+from ..models import PRIMARY_DEVICE
+
+BUCKETS = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+# Buckets that can be served from the rollup table (see service.rollup)
+ROLLUP_PERIODS = {"1h": "hour", "1d": "day"}
+
+DEFAULT_RANGE = timedelta(days=1)
+RAW_POINTS = int(os.environ.get("AGGREGATE_RAW_POINTS", 1000))  # raw rows are always thinned to this
+MAX_POINTS = int(os.environ.get("AGGREGATE_MAX_POINTS", 5000))
+
+
+def numeric_columns(model):
+    return [
+        column.name for column in model.__table__.columns
+        if isinstance(column.type, (Float, Integer)) and not column.primary_key
+    ]
+
+
+def bucket_start(db, column, size):
+    """SQL expression for the start of the bucket, in epoch seconds of the stored
+    (naive, local) timestamp."""
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%s", column), Integer) // size * size
+    return cast(func.floor(func.extract("epoch", column) / size) * size, Integer)
+
+
+def from_epoch(seconds):
+    return datetime.fromtimestamp(int(seconds), timezone.utc).replace(tzinfo=None)
+
+
+def lttb(x, y, threshold):
+    """Indices of the `threshold` points LTTB keeps from the series (x, y)."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    # Bucket edges for the n - 2 inner points; first and last are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Twice the triangle area between the last kept point, each candidate and the next bucket's average
+        area = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def aggregate(db, model, start=None, end=None, bucket="1h", fields=None, points=None, device=None):
+    """Bucketed (or raw) history of `model` between `start` and `end`.
+
+    `fields` is a list or comma separated string of numeric columns (all of
+    them by default). Hourly and daily buckets of rolled up columns are read
+    from the rollup table, and always cover whole hours/days. Tables with a
+    device column are charted for one device, the primary one by default.
+    Raises ValueError for an unknown bucket or field.
+    """
+    from ..service import rollup  # the rollup service builds on this module
+
+    end = end or datetime.now()
+    start = start or end - DEFAULT_RANGE
+    if start >= end:
+        raise ValueError("start must be before end")
+    if bucket != "raw" and bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket '{bucket}', expected one of {['raw', *BUCKETS]}")
+
+    available = numeric_columns(model)
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    fields = fields or available
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f"Unknown field(s) {unknown}, expected any of {available}")
+
+    if points is not None:
+        points = max(3, min(points, MAX_POINTS))
+    in_range = (model.timestamp >= start) & (model.timestamp < end)
+    if hasattr(model, "device"):
+        device = device or PRIMARY_DEVICE
+        in_range = in_range & (model.device == device)
+
+    if bucket == "raw":
+        query = (
+            select(model.timestamp, *(getattr(model, field) for field in fields))
+            .where(in_range)
+            .order_by(model.timestamp)
+        )
+        data = [
+            {"timestamp": row[0].strftime("%Y-%m-%d %H:%M:%S"), **dict(zip(fields, row[1:]))}
+            for row in db.execute(query)
+        ]
+        points = points or RAW_POINTS
+        source = "raw"
+    elif (
+        bucket in ROLLUP_PERIODS
+        and device in (None, PRIMARY_DEVICE)  # only the primary device is rolled up
+        and all(rollup.metric_for(model, field) for field in fields)
+    ):
+        data = from_rollups(db, rollup, model, fields, start, end, ROLLUP_PERIODS[bucket])
+        source = "rollup"
+    else:
+        data = bucketed(db, model, fields, in_range, BUCKETS[bucket])
+        source = "raw"
+
+    sampled = False
+    if points is not None and len(data) > points:
+        x = [datetime.strptime(row["timestamp"], "%Y-%m-%d %H:%M:%S").timestamp() for row in data]
+        first = fields[0]
+        y = [row[first] if bucket == "raw" else row[first]["avg"] for row in data]
+        y = [np.nan if value is None else value for value in y]
+        data = [data[i] for i in lttb(x, y, points)]
+        sampled = True
+
+    return {
+        "start": start.strftime("%Y-%m-%d %H:%M:%S"),
+        "end": end.strftime("%Y-%m-%d %H:%M:%S"),
+        "bucket": bucket,
+        "fields": fields,
+        "source": source,
+        "downsampled": sampled,
+        "data": data,
+    }
+
+
+def bucket_stats(db, model, fields, in_range, size):
+    """Rows of (bucket start in epoch seconds, row count, newest timestamp, then
+    count, min, max, sum and last of every field), one per non-empty bucket,
+    oldest first."""
+    bucket = bucket_start(db, model.timestamp, size).label("bucket")
+    # Newest row of each bucket gets rank 1, for "last"
+    rank = func.row_number().over(partition_by=bucket, order_by=model.timestamp.desc()).label("rank")
+    rows = (
+        select(bucket, rank, model.timestamp, *(getattr(model, field) for field in fields))
+        .where(in_range)
+        .subquery()
+    )
+
+    columns = [rows.c.bucket, func.count(), func.max(rows.c.timestamp)]
+    for field in fields:
+        value = rows.c[field]
+        columns += [
+            func.count(value), func.min(value), func.max(value), func.sum(value),
+            func.max(case((rows.c.rank == 1, value))),
+        ]
+    query = select(*columns).group_by(rows.c.bucket).order_by(rows.c.bucket)
+    return db.execute(query).all()
+
+
+def summary(count, low, high, total, last):
+    return {
+        "min": low,
+        "max": high,
+        "avg": round(total / count, 4) if count else None,
+        "last": last,
+    }
+
+
+def bucketed(db, model, fields, in_range, size):
+    data = []
+    for row in bucket_stats(db, model, fields, in_range, size):
+        entry = {"timestamp": from_epoch(row[0]).strftime("%Y-%m-%d %H:%M:%S"), "count": row[1]}
+        for i, field in enumerate(fields):
+            entry[field] = summary(*row[3 + i * 5: 8 + i * 5])
+        data.append(entry)
+    return data
+
+
+def from_rollups(db, rollup, model, fields, start, end, period):
+    entries = {}
+    for field in fields:
+        for row in rollup.series(db, rollup.metric_for(model, field), period, start, end):
+            entry = entries.get(row.bucket)
+            if entry is None:
+                entry = entries[row.bucket] = {
+                    "timestamp": row.bucket.strftime("%Y-%m-%d %H:%M:%S"),
+                    "count": 0,
+                    **{name: summary(0, None, None, None, None) for name in fields},
+                }
+            entry["count"] = max(entry["count"], row.count)
+            entry[field] = summary(row.count, row.minimum, row.maximum, row.total, row.last)
+    return [entries[bucket] for bucket in sorted(entries)]
@@ -1,49 +1,187 @@
+import asyncio
 import cv2
+import os
 import threading
 import time
 
+# Comma separated name:device pairs, e.g. "main:1,lab:0". The first one is the default.
+CAMERAS = os.environ.get("CAMERAS", "main:1")
+CAMERA_WIDTH = int(os.environ.get("CAMERA_WIDTH", 1280))
+CAMERA_HEIGHT = int(os.environ.get("CAMERA_HEIGHT", 720))
+CAMERA_FPS = float(os.environ.get("CAMERA_FPS", 5))
+
+# Size of the grayscale thumbnail used to measure scene change
+MOTION_SIZE = (160, 90)
+
+# Frames are captured into a small ring of reused arrays. A frame stays valid
+# for FRAME_BUFFERS - 1 capture periods; copy it if you need it for longer.
+FRAME_BUFFERS = 3
+
 
 class CameraStream:
-    """Singleton camera class to optimize CPU usage for low-power devices."""
-
-    _instance = None
-    _lock = threading.Lock()
-
-    def __new__(cls):
-        with cls._lock:
-            if cls._instance is None:
-                cls._instance = super(CameraStream, cls).__new__(cls)
-                cls._instance.camera = cv2.VideoCapture(1)
-                cls._instance.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)  # Lebih ringan
-                cls._instance.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)  # Lebih ringan
-                cls._instance.running = True
-                cls._instance.frame = None
-                cls._instance.fps_limit = 5  # Batasi ke 5 FPS
-                cls._instance.thread = threading.Thread(
-                    target=cls._instance._update, daemon=True
-                )
-                cls._instance.thread.start()
-        return cls._instance
+    """One capture thread per camera device, shared by every consumer.
+
+    Consumers either read the latest frame with get_frame(), or block/await
+    the next one with wait_for_frame()/next_frame() using the frame sequence
+    number they last saw.
+    """
+
+    def __init__(self, name, device, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps_limit=CAMERA_FPS):
+        self.name = name
+        self.device = device
+        self.camera = cv2.VideoCapture(device)
+        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)  # Lebih ringan
+        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)  # Lebih ringan
+        self.fps_limit = fps_limit  # Batasi FPS
+
+        self.running = True
+        self.frame = None
+        self.frame_seq = 0  # bumped on every new frame
+        self.condition = threading.Condition()
+        self.async_waiters = []  # (loop, future) pairs waiting for the next frame
+        self.buffers = [None] * FRAME_BUFFERS
+
+        self.motion_lock = threading.Lock()
+        self.motion_enabled = os.environ.get("MOTION_DETECTION", "1") == "1"
+        self.previous_thumbnail = None
+        self.change_score = 0.0
+        self.peak_change = 0.0
+
+        self.thread = threading.Thread(target=self._update, daemon=True, name=f"camera-{name}")
+        self.thread.start()
 
     def _update(self):
         """Continuously capture frames at a limited frame rate."""
+        index = 0
         while self.running:
             start_time = time.time()
-            success, frame = self.camera.read()
+            # read() fills the given array in place when its shape matches
+            success, frame = self.camera.read(self.buffers[index])
             if success:
-                self.frame = frame
+                self.buffers[index] = frame
+                index = (index + 1) % FRAME_BUFFERS
+                self._publish(frame)
+                if self.motion_enabled:
+                    self._track_motion(frame)
             time.sleep(
                 max(0, 1 / self.fps_limit - (time.time() - start_time))
             )  # Batasi FPS
 
-    def get_frame(self):
-        """Return the latest frame."""
-        return self.frame
+    def _publish(self, frame):
+        with self.condition:
+            self.frame = frame
+            self.frame_seq += 1
+            seq = self.frame_seq
+            waiters, self.async_waiters = self.async_waiters, []
+            self.condition.notify_all()
+
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, (seq, frame))
+            except RuntimeError:
+                pass  # the waiting event loop has already been closed
+
+    def _track_motion(self, frame):
+        """Update the change score: mean absolute difference between consecutive
+        blurred grayscale thumbnails, as a fraction of full scale (0..1)."""
+        thumbnail = cv2.GaussianBlur(
+            cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), MOTION_SIZE), (5, 5), 0
+        )
+        if self.previous_thumbnail is not None:
+            score = cv2.absdiff(thumbnail, self.previous_thumbnail).mean() / 255.0
+            with self.motion_lock:
+                self.change_score = score
+                self.peak_change = max(self.peak_change, score)
+        self.previous_thumbnail = thumbnail
+
+    def take_peak_change(self):
+        """Return the largest change score seen since the last call and reset it."""
+        with self.motion_lock:
+            peak = self.peak_change
+            self.peak_change = 0.0
+        return peak
+
+    def get_frame(self, copy=False):
+        """Return the latest frame (a copy when `copy` is set)."""
+        frame = self.frame
+        if copy and frame is not None:
+            return frame.copy()
+        return frame
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Block until a frame newer than `after_seq` exists. Returns (seq, frame);
+        frame is None if the timeout expired first."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_seq > after_seq or not self.running, timeout)
+            if self.frame_seq > after_seq:
+                return self.frame_seq, self.frame
+            return self.frame_seq, None
+
+    async def next_frame(self, after_seq=0, timeout=None):
+        """Async version of wait_for_frame() that does not tie up a thread."""
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            if self.frame_seq > after_seq:
+                return self.frame_seq, self.frame
+            future = loop.create_future()
+            self.async_waiters.append((loop, future))
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self.condition:
+                if (loop, future) in self.async_waiters:
+                    self.async_waiters.remove((loop, future))
+            return self.frame_seq, None
 
     def stop(self):
         """Release the camera."""
         self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        self.thread.join(timeout=2)
         self.camera.release()
 
 
-camera_stream = CameraStream()
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+class CameraRegistry:
+    """Named camera streams. Each device is opened once, on first use."""
+
+    def __init__(self, config=CAMERAS):
+        self.devices = {}
+        for entry in config.split(","):
+            name, _, device = entry.strip().partition(":")
+            self.devices[name] = int(device) if device.isdigit() else device
+        self.default = next(iter(self.devices))
+        self.streams = {}
+        self.lock = threading.Lock()
+
+    def get(self, name=None) -> CameraStream:
+        name = name or self.default
+        if name not in self.devices:
+            raise KeyError(f"Unknown camera '{name}', expected one of {list(self.devices)}")
+        with self.lock:
+            if name not in self.streams:
+                self.streams[name] = CameraStream(name, self.devices[name])
+            return self.streams[name]
+
+    def peek(self, name=None):
+        """The stream if it has been opened already, else None (never opens the device)."""
+        with self.lock:
+            return self.streams.get(name or self.default)
+
+    def names(self):
+        return list(self.devices)
+
+    def stop_all(self):
+        with self.lock:
+            for stream in self.streams.values():
+                stream.stop()
+            self.streams.clear()
+
+
+camera_registry = CameraRegistry()
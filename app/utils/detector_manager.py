@@ -0,0 +1,241 @@
+import asyncio
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+warnings.filterwarnings("ignore", category=UserWarning, module="torchvision.models._utils")
+
+# name -> (weights file, imageai setter)
+DETECTION_MODELS = {
+    "retinanet": ("models/retinanet_resnet50_fpn_coco-eeacb38b.pth", "setModelTypeAsRetinaNet"),
+    "yolov3": ("models/yolov3.pt", "setModelTypeAsYOLOv3"),
+    "yolov3-tiny": ("models/yolov3-tiny.pt", "setModelTypeAsTinyYOLOv3"),
+}
+
+DETECTION_MODEL = os.environ.get("DETECTION_MODEL", "retinanet").lower()
+DETECTION_MODEL_PATH = os.environ.get("DETECTION_MODEL_PATH")  # override the default weights file
+MIN_PROBABILITY = int(os.environ.get("DETECTION_MIN_PROBABILITY", 15))
+DETECTION_WORKERS = int(os.environ.get("DETECTION_WORKERS", 1))  # concurrent detections
+DETECTION_TIMEOUT = float(os.environ.get("DETECTION_TIMEOUT", 60))  # seconds
+
+# imageai only keeps RetinaNet boxes scoring at least 0.5, keep the same cut-off
+RETINANET_SCORE_THRESHOLD = 0.5
+RETINANET_PERSON_LABEL = 1  # COCO-91 index of "person"
+
+execution_path = os.getcwd()
+
+
+class PeopleDetector:
+    """Singleton person detector that keeps the model loaded between runs.
+
+    RetinaNet runs straight on torchvision; the YOLO variants go through imageai.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(PeopleDetector, cls).__new__(cls)
+                cls._instance.detector = None
+                cls._instance.custom_objects = None
+                cls._instance.model_name = DETECTION_MODEL
+                cls._instance.load_lock = threading.Lock()
+                cls._instance.load_seconds = None
+                cls._instance.cold_inference_seconds = None
+                cls._instance.warm_inference_count = 0
+                cls._instance.warm_inference_total = 0.0
+                cls._instance.last_inference_seconds = None
+                cls._instance.stats_lock = threading.Lock()
+                cls._instance.executor = ThreadPoolExecutor(
+                    max_workers=DETECTION_WORKERS, thread_name_prefix="detector"
+                )
+                cls._instance.slots = None
+                cls._instance.in_flight = 0  # worker threads busy, including abandoned ones
+                cls._instance.abandoned = set()  # timed out, worker still running
+                cls._instance.waiting = 0
+                cls._instance.completed = 0
+                cls._instance.failures = 0
+                cls._instance.timeouts = 0
+                cls._instance.last_latency_seconds = None
+        return cls._instance
+
+    @property
+    def loaded(self):
+        return self.detector is not None
+
+    def load(self):
+        """Load the configured model once; later calls return immediately."""
+        with self.load_lock:
+            if self.detector is not None:
+                return self.detector
+
+            if self.model_name not in DETECTION_MODELS:
+                raise ValueError(
+                    f"Unknown DETECTION_MODEL '{self.model_name}', expected one of {list(DETECTION_MODELS)}"
+                )
+            default_path, set_model_type = DETECTION_MODELS[self.model_name]
+            model_path = DETECTION_MODEL_PATH or default_path
+
+            start = time.perf_counter()
+            if self.model_name == "retinanet":
+                detector = self._load_retinanet(model_path)
+            else:
+                detector = self._load_imageai(model_path, set_model_type)
+
+            self.detector = detector
+            self.load_seconds = round(time.perf_counter() - start, 3)
+            print(f"✅ Detection model '{self.model_name}' loaded in {self.load_seconds}s")
+            return detector
+
+    def _load_retinanet(self, model_path):
+        # Same network and weights imageai builds for setModelTypeAsRetinaNet(),
+        # used directly so frames can be fed as tensors without a file round-trip.
+        import torch
+        import torchvision
+
+        model = torchvision.models.detection.retinanet_resnet50_fpn(
+            weights=None, weights_backbone=None, num_classes=91
+        )
+        state_dict = torch.load(os.path.join(execution_path, model_path), map_location="cpu")
+        model.load_state_dict(state_dict)
+        model.eval()
+        return model
+
+    def _load_imageai(self, model_path, set_model_type):
+        from imageai.Detection import ObjectDetection
+
+        detector = ObjectDetection()
+        getattr(detector, set_model_type)()
+        detector.setModelPath(os.path.join(execution_path, model_path))
+        detector.loadModel()
+        self.custom_objects = detector.CustomObjects(person=True)
+        return detector
+
+    def detect_people(self, frame):
+        """Run person detection on a BGR frame and return the boxes as (x1, y1, x2, y2, score)."""
+        detector = self.load()
+
+        start = time.perf_counter()
+        if self.model_name == "retinanet":
+            boxes = self._detect_retinanet(detector, frame)
+        else:
+            _, detections = detector.detectObjectsFromImage(
+                input_image=frame,
+                output_type="array",
+                minimum_percentage_probability=MIN_PROBABILITY,
+                custom_objects=self.custom_objects,
+            )
+            boxes = [
+                (*d["box_points"], d["percentage_probability"] / 100) for d in detections
+            ]
+        self._record(time.perf_counter() - start)
+        return boxes
+
+    def count_people(self, frame):
+        return len(self.detect_people(frame))
+
+    async def run(self, frame, timeout: float = DETECTION_TIMEOUT):
+        """Run detect_people() on the worker pool without blocking the event loop.
+
+        At most DETECTION_WORKERS detections run at once; later callers wait
+        for a free slot. On timeout the caller gets asyncio.TimeoutError, but
+        the worker thread cannot be interrupted: it keeps its slot (and counts
+        as in flight and abandoned) until it finishes in the background.
+        """
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(DETECTION_WORKERS)
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        future = loop.run_in_executor(self.executor, self.detect_people, frame)
+        future.add_done_callback(self._worker_done)
+        try:
+            # shield: a timeout must not mark the future done while the thread still runs
+            boxes = await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.abandoned.add(future)
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.last_latency_seconds = round(time.perf_counter() - start, 3)
+        self.completed += 1
+        return boxes
+
+    def _worker_done(self, future):
+        """Free the slot once the worker thread has actually finished."""
+        self.in_flight -= 1
+        self.slots.release()
+        if future in self.abandoned:
+            self.abandoned.discard(future)
+            if not future.cancelled() and future.exception() is not None:
+                print(f"Abandoned detection failed: {future.exception()}")
+
+    @staticmethod
+    def _detect_retinanet(model, frame):
+        import cv2
+        import torch
+
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        tensor = torch.from_numpy(rgb).permute(2, 0, 1).float().div_(255.0)
+        with torch.no_grad():
+            output = model([tensor])[0]
+
+        threshold = max(RETINANET_SCORE_THRESHOLD, MIN_PROBABILITY / 100)
+        keep = (output["labels"] == RETINANET_PERSON_LABEL) & (output["scores"] >= threshold)
+        boxes = output["boxes"][keep].int().tolist()
+        scores = output["scores"][keep].tolist()
+        return [(*box, round(score, 3)) for box, score in zip(boxes, scores)]
+
+    def _record(self, seconds):
+        with self.stats_lock:
+            self.last_inference_seconds = round(seconds, 3)
+            if self.cold_inference_seconds is None:
+                self.cold_inference_seconds = self.last_inference_seconds
+            else:
+                self.warm_inference_count += 1
+                self.warm_inference_total += seconds
+
+    def status(self):
+        warm_avg = (
+            round(self.warm_inference_total / self.warm_inference_count, 3)
+            if self.warm_inference_count else None
+        )
+        return {
+            "model": self.model_name,
+            "loaded": self.loaded,
+            "load_seconds": self.load_seconds,
+            "cold_inference_seconds": self.cold_inference_seconds,
+            "warm_inference_avg_seconds": warm_avg,
+            "warm_inference_count": self.warm_inference_count,
+            "last_inference_seconds": self.last_inference_seconds,
+            "workers": DETECTION_WORKERS,
+            "timeout_seconds": DETECTION_TIMEOUT,
+            "in_flight": self.in_flight,
+            "abandoned": len(self.abandoned),
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "last_latency_seconds": self.last_latency_seconds,
+        }
+
+
+people_detector = PeopleDetector()
@@ -0,0 +1,71 @@
+"""Import-time profiling for the server's modules.
+
+main.py imports routers and services through timed_import(), so the cost of
+each one at startup is available at /system/import-profile. For a per-module
+breakdown (including third-party packages) run:
+
+    python -m app.utils.import_profile [module ...]
+"""
+import importlib
+import subprocess
+import sys
+import time
+
+DEFAULT_MODULES = [
+    "app.routers.pzem", "app.routers.aht10", "app.routers.camera", "app.routers.openweather",
+    "app.routers.analysis", "app.routers.carbonemission", "app.routers.actemp",
+    "app.routers.pmvashrae", "app.routers.insight", "app.routers.system",
+    "app.service.web_cam", "app.service.pmv",
+]
+
+import_times = {}  # module name -> seconds spent importing it at startup
+
+
+def timed_import(name):
+    """Import a module and record how long it took (shared dependencies are
+    charged to whichever module imports them first)."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = round(time.perf_counter() - start, 4)
+    return module
+
+
+def startup_report():
+    return [
+        {"module": name, "seconds": seconds}
+        for name, seconds in sorted(import_times.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+def profile_modules(modules=DEFAULT_MODULES, top=20):
+    """Run `python -X importtime` in a fresh interpreter and return the most expensive imports."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def main():
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in profile_modules(modules):
+        print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
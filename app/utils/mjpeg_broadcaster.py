@@ -0,0 +1,121 @@
+import asyncio
+import cv2
+import time
+
+from .camera_manager import camera_registry
+
+BOUNDARY = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+
+
+class MjpegBroadcaster:
+    """Shares one JPEG encode of each new camera frame between all /camera/stream clients.
+
+    Every (quality, width) combination that has at least one subscriber is
+    encoded once per frame. Clients always pick up the newest encoded frame,
+    so a slow client simply skips the frames it was too slow to send.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.subscribers = {}  # (quality, width) -> number of clients
+        self.encoded = {}  # (quality, width) -> (frame_seq, jpeg bytes)
+        self.condition = None
+        self.task = None
+        self.frames_encoded = 0
+        self.encodes = 0
+        self.last_encode_seconds = None
+
+    async def frames(self, quality=50, width=0, fps=5.0):
+        """Async generator of multipart MJPEG chunks for one client."""
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+
+        key = (quality, width)
+        self.subscribers[key] = self.subscribers.get(key, 0) + 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+        loop = asyncio.get_running_loop()
+        interval = 1 / fps
+        last_seq = None
+        try:
+            while True:
+                started = loop.time()
+                async with self.condition:
+                    await self.condition.wait_for(
+                        lambda: key in self.encoded and self.encoded[key][0] != last_seq
+                    )
+                    last_seq, jpeg = self.encoded[key]
+
+                yield BOUNDARY + jpeg + b"\r\n"
+                await asyncio.sleep(max(0, interval - (loop.time() - started)))
+        finally:
+            self.subscribers[key] -= 1
+            if self.subscribers[key] == 0:
+                del self.subscribers[key]
+                self.encoded.pop(key, None)
+
+    async def _run(self):
+        last_seq = 0
+        while self.subscribers:
+            seq, frame = await self.stream.next_frame(last_seq, timeout=1.0)
+            if frame is not None:
+                keys = list(self.subscribers)
+                try:
+                    encoded = await asyncio.to_thread(self._encode, frame, keys)
+                except Exception as e:
+                    print(f"Failed to encode stream frame: {e}")
+                    encoded = {}
+
+                last_seq = seq
+                async with self.condition:
+                    for key, jpeg in encoded.items():
+                        if key in self.subscribers:
+                            self.encoded[key] = (seq, jpeg)
+                    self.condition.notify_all()
+
+    def _encode(self, frame, keys):
+        start = time.perf_counter()
+        resized = {}
+        encoded = {}
+        for quality, width in keys:
+            if width not in resized:
+                height, frame_width = frame.shape[:2]
+                if width and width < frame_width:
+                    size = (width, round(height * width / frame_width))
+                    resized[width] = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                else:
+                    resized[width] = frame
+            _, buffer = cv2.imencode(".jpg", resized[width], [cv2.IMWRITE_JPEG_QUALITY, quality])
+            encoded[(quality, width)] = buffer.tobytes()
+
+        self.frames_encoded += 1
+        self.encodes += len(keys)
+        self.last_encode_seconds = round(time.perf_counter() - start, 4)
+        return encoded
+
+    def status(self):
+        return {
+            "camera": self.stream.name,
+            "clients": sum(self.subscribers.values()),
+            "variants": [
+                {"quality": quality, "width": width, "clients": count}
+                for (quality, width), count in self.subscribers.items()
+            ],
+            "frames_encoded": self.frames_encoded,
+            "encodes": self.encodes,
+            "last_encode_seconds": self.last_encode_seconds,
+        }
+
+
+_broadcasters = {}
+
+def get_broadcaster(camera=None) -> MjpegBroadcaster:
+    """Return the broadcaster for a named camera, creating it on first use."""
+    stream = camera_registry.get(camera)
+    if stream.name not in _broadcasters:
+        _broadcasters[stream.name] = MjpegBroadcaster(stream)
+    return _broadcasters[stream.name]
+
+def broadcaster_status():
+    return [broadcaster.status() for broadcaster in _broadcasters.values()]
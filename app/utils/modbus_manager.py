@@ -0,0 +1,215 @@
+"""Long-lived Modbus RTU sessions on the RS-485 bus.
+
+Each serial port is opened once and shared by every device on it (one slave
+ID each, e.g. several PZEM-004T meters). A lock serialises the requests,
+since only one frame can be on the bus at a time. A device that does not
+answer only fails its own request; a port error closes the port, which is
+reopened on a later request after a backoff that doubles up to
+MODBUS_MAX_BACKOFF.
+
+The blocking calls are meant for worker threads; `read()` wraps them with
+asyncio.to_thread for use on the event loop.
+"""
+import asyncio
+import os
+import struct
+import threading
+import time
+
+import modbus_tk.modbus_rtu as modbus_rtu
+import serial
+from modbus_tk.exceptions import ModbusError, ModbusInvalidResponseError
+
+MODBUS_PORT = os.environ.get("MODBUS_PORT", "/dev/ttyUSB0")  # Ganti dengan port USB-TTL Anda
+MODBUS_BAUDRATE = int(os.environ.get("MODBUS_BAUDRATE", 9600))
+MODBUS_TIMEOUT = float(os.environ.get("MODBUS_TIMEOUT", 2.0))  # seconds to wait for a response
+MODBUS_BACKOFF = float(os.environ.get("MODBUS_BACKOFF", 1.0))  # first reconnect delay, seconds
+MODBUS_MAX_BACKOFF = float(os.environ.get("MODBUS_MAX_BACKOFF", 60.0))
+
+# Errors from one device answering badly or not at all; the port itself is fine
+DEVICE_ERRORS = (ModbusError, ModbusInvalidResponseError)
+
+
+class ModbusUnavailable(RuntimeError):
+    """The port failed recently and is waiting out its backoff."""
+
+
+def calculate_crc(data):
+    """Calculate CRC-16 (Modbus standard)"""
+    crc = 0xFFFF
+    for pos in data:
+        crc ^= pos
+        for _ in range(8):
+            if crc & 0x0001:
+                crc >>= 1
+                crc ^= 0xA001
+            else:
+                crc >>= 1
+    return struct.pack('<H', crc)
+
+
+class ModbusSession:
+    def __init__(self, port, baudrate=MODBUS_BAUDRATE, timeout=MODBUS_TIMEOUT):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.serial = None
+        self.master = None
+
+        self.backoff = 0.0
+        self.retry_at = 0.0  # monotonic
+        self.connects = 0
+        self.port_errors = 0
+        self.last_error = None
+        self.devices = {}  # slave id -> request/error counters
+
+    def _connect(self):
+        """Return the RTU master, opening the port if needed. Lock must be held."""
+        if self.master is not None:
+            return self.master
+        wait = self.retry_at - time.monotonic()
+        if wait > 0:
+            raise ModbusUnavailable(f"{self.port} unavailable, retrying in {wait:.0f}s: {self.last_error}")
+
+        try:
+            connection, master = self._open()
+        except Exception as e:
+            self._port_failed(e)
+            raise
+        self.serial, self.master = connection, master
+        self.connects += 1
+        return master
+
+    def _open(self):
+        """Open the port. Returns (serial connection, RTU master)."""
+        connection = serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            bytesize=8,
+            parity='N',
+            stopbits=1,
+            timeout=1
+        )
+        master = modbus_rtu.RtuMaster(connection)
+        master.set_timeout(self.timeout)
+        master.set_verbose(False)
+        return connection, master
+
+    def _close(self):
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+        self.serial = self.master = None
+
+    def _port_failed(self, error):
+        self._close()
+        self.port_errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.backoff = min(max(self.backoff * 2, MODBUS_BACKOFF), MODBUS_MAX_BACKOFF)
+        self.retry_at = time.monotonic() + self.backoff
+        print(f"Modbus port {self.port} failed ({self.last_error}), reconnecting in {self.backoff:.0f}s")
+
+    def _device(self, slave_id):
+        return self.devices.setdefault(slave_id, {"requests": 0, "errors": 0, "last_error": None})
+
+    def _call(self, slave_id, request):
+        """Run `request(serial, master)` under the lock, reconnecting as needed."""
+        device = self._device(slave_id)
+        with self.lock:
+            device["requests"] += 1
+            # A port that was healthy gets one immediate reopen (e.g. it was
+            # idle and the adapter was replugged); after that, the backoff applies
+            for attempt in range(2):
+                master = self._connect()
+                try:
+                    result = request(self.serial, master)
+                except DEVICE_ERRORS as e:
+                    device["errors"] += 1
+                    device["last_error"] = f"{type(e).__name__}: {e}"
+                    raise
+                except Exception as e:
+                    device["errors"] += 1
+                    device["last_error"] = f"{type(e).__name__}: {e}"
+                    retry = attempt == 0 and self.backoff == 0
+                    self._port_failed(e)
+                    if retry:
+                        self.retry_at = 0.0
+                        continue
+                    raise
+                self.backoff = 0.0
+                return result
+
+    def execute(self, slave_id, function_code, address, length, timeout=None):
+        """Blocking Modbus request, e.g. READ_INPUT_REGISTERS. Returns the register
+        values. `timeout` overrides the session's response timeout for this request."""
+        def request(connection, master):
+            master.set_timeout(timeout or self.timeout)
+            return master.execute(slave_id, function_code, address, length)
+
+        return self._call(slave_id, request)
+
+    def send_raw(self, slave_id, function_code, response_length=4):
+        """Send a bare `slave_id, function_code` frame (for functions modbus_tk
+        does not know, like the PZEM energy reset) and return the response."""
+        frame = bytes([slave_id, function_code])
+        frame += calculate_crc(frame)
+
+        def request(connection, master):
+            connection.reset_input_buffer()
+            connection.write(frame)
+            return connection.read(response_length)
+
+        return self._call(slave_id, request)
+
+    async def read(self, slave_id, function_code, address, length, timeout=None):
+        """execute() in a worker thread, so the event loop keeps running."""
+        return await asyncio.to_thread(self.execute, slave_id, function_code, address, length, timeout)
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def status(self):
+        with self.lock:
+            return {
+                "port": self.port,
+                "connected": self.master is not None,
+                "connects": self.connects,
+                "port_errors": self.port_errors,
+                "backoff": self.backoff,
+                "retry_in": round(max(self.retry_at - time.monotonic(), 0), 1),
+                "last_error": self.last_error,
+                "devices": {slave_id: dict(counters) for slave_id, counters in self.devices.items()},
+            }
+
+
+class ModbusRegistry:
+    """One session per serial port, created on first use."""
+
+    def __init__(self, default_port=MODBUS_PORT):
+        self.default_port = default_port
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, port=None) -> ModbusSession:
+        port = port or self.default_port
+        with self.lock:
+            if port not in self.sessions:
+                self.sessions[port] = ModbusSession(port)
+            return self.sessions[port]
+
+    def close_all(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+
+    def status(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return [session.status() for session in sessions]
+
+
+modbus_sessions = ModbusRegistry()
@@ -0,0 +1,135 @@
+"""Pagination helpers for the data_* listing endpoints.
+
+Two ways to page through a table, newest first:
+
+* `?page=N` (what the dashboard uses) keeps working, with OFFSET.
+* `?cursor=...`, taken from the `next_cursor` of the previous response, seeks
+  directly to (timestamp, id) on the timestamp index, so every page costs the
+  same no matter how deep it is.
+
+Row totals come from RowCounts rather than a COUNT(*) per request. Totals of
+filtered listings (e.g. one PZEM device) are cached too, but cannot follow the
+inserts, so they may lag by up to COUNT_REFRESH_INTERVAL.
+"""
+import base64
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, event, func, or_, select
+
+from ..database import engine
+
+PAGE_SIZE = int(os.environ.get("PAGE_SIZE", 10))
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 500))
+# Cached totals are recounted after this long, to correct drift (e.g. rolled back inserts)
+COUNT_REFRESH_INTERVAL = float(os.environ.get("COUNT_REFRESH_INTERVAL", 300))  # seconds
+
+
+class RowCounts:
+    """Per-table row totals, counted once and then kept up to date from the
+    rowcount of every INSERT/DELETE run through the engine."""
+
+    def __init__(self, refresh_interval=COUNT_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        # table name, or (table name, *filter conditions) -> (count, counted_at)
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def get(self, db, model, filters=()):
+        table = model.__tablename__
+        key = table
+        if filters:
+            key = (table, *(str(f.compile(compile_kwargs={"literal_binds": True})) for f in filters))
+        with self.lock:
+            cached = self.counts.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.refresh_interval:
+            return cached[0]
+
+        count = db.execute(select(func.count()).select_from(model).where(*filters)).scalar_one()
+        with self.lock:
+            self.counts[key] = (count, time.monotonic())
+        return count
+
+    def adjust(self, table, delta):
+        with self.lock:
+            if table in self.counts:
+                count, counted_at = self.counts[table]
+                self.counts[table] = (max(count + delta, 0), counted_at)
+
+    def invalidate(self, table=None):
+        with self.lock:
+            if table is None:
+                self.counts.clear()
+            else:
+                stale = [key for key in self.counts if key == table or (isinstance(key, tuple) and key[0] == table)]
+                for key in stale:
+                    del self.counts[key]
+
+
+row_counts = RowCounts()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _track_row_counts(conn, cursor, statement, parameters, context, executemany):
+    if not (context.isinsert or context.isdelete):
+        return
+    table = getattr(getattr(context.compiled, "statement", None), "table", None)
+    if table is None:
+        return
+    if cursor.rowcount < 0:
+        row_counts.invalidate(table.name)  # driver could not say how many rows changed
+    else:
+        row_counts.adjust(table.name, cursor.rowcount if context.isinsert else -cursor.rowcount)
+
+
+def encode_cursor(record):
+    raw = f"{record.timestamp.isoformat()}|{record.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id). Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, record_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'") from e
+
+
+def paginate(db, model, page=1, limit=PAGE_SIZE, cursor=None, filters=()):
+    """Return (records, meta) for one page of `model`, newest first.
+
+    With a cursor, `page` is ignored and the page starts right after the
+    record the cursor points at. `filters` are extra WHERE conditions.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(model).filter(*filters).order_by(model.timestamp.desc(), model.id.desc())
+
+    if cursor:
+        timestamp, record_id = decode_cursor(cursor)
+        # (timestamp, id) < cursor, with a plain upper bound so the index is seeked, not walked
+        query = query.filter(and_(
+            model.timestamp <= timestamp,
+            or_(model.timestamp < timestamp, model.id < record_id),
+        ))
+        page = None
+    else:
+        page = max(page, 1)
+        query = query.offset((page - 1) * limit)
+
+    # One extra row tells whether there is a next page
+    records = query.limit(limit + 1).all()
+    has_more = len(records) > limit
+    records = records[:limit]
+
+    total_records = row_counts.get(db, model, filters)
+    return records, {
+        "page": page,
+        "limit": limit,
+        "total_pages": (total_records + limit - 1) // limit,
+        "total_records": total_records,
+        "next_cursor": encode_cursor(records[-1]) if has_more else None,
+    }
@@ -0,0 +1,228 @@
+"""A small dependency-aware task runner for the periodic services.
+
+Source tasks (those without dependencies) are APScheduler jobs with their
+own interval, jitter and timeout, so they run concurrently and a slow or
+hanging one only holds up itself. A task with dependencies has no timer: it
+runs as soon as every task it depends on has succeeded again since its own
+previous run, so it always works on the newest inputs. It is skipped when
+one of them has not succeeded recently enough (its output would be stale).
+
+A task can adapt its interval to the data: AdaptiveInterval shortens it while
+a watched value changes quickly and stretches it again while it is stable.
+
+Plain functions run in a worker thread; `async def` functions on the loop.
+"""
+import asyncio
+import inspect
+import time
+from datetime import datetime
+
+from apscheduler.triggers.interval import IntervalTrigger
+
+
+class AdaptiveInterval:
+    """Interval policy driven by a watched value (e.g. the latest power reading)."""
+
+    def __init__(self, read_value, min_interval, max_interval, threshold=0.1, speedup=2.0, slowdown=1.25):
+        self.read_value = read_value  # returns the current value, or None
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold  # relative change that counts as "changing quickly"
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.previous = None
+
+    def next_interval(self, interval):
+        value = self.read_value()
+        if value is None:
+            return interval
+        previous, self.previous = self.previous, value
+        if previous is None:
+            return interval
+
+        # Relative change, with a floor of 1 so small integer counts (occupancy) still register
+        change = abs(value - previous) / max(abs(previous), 1.0)
+        if change >= self.threshold:
+            interval /= self.speedup
+        else:
+            interval *= self.slowdown
+        return min(max(interval, self.min_interval), self.max_interval)
+
+
+class Task:
+    def __init__(self, name, func, deps=(), interval=600.0, timeout=60.0, max_age=None, jitter=0, adaptive=None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.interval = interval
+        self.timeout = timeout
+        self.jitter = jitter  # seconds of random delay added to each run
+        self.adaptive = adaptive
+        # Dependents treat this task's output as fresh for this long after a success
+        longest = adaptive.max_interval if adaptive else interval
+        self.max_age = max_age if max_age is not None else 2 * longest
+
+        self.pending = None  # worker thread future still running after a timeout
+        self.last_started = None  # monotonic
+        self.last_success = None  # monotonic
+        self.last_status = None
+        self.last_error = None
+        self.last_run_at = None  # wall clock, for display
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skips = 0
+
+    def fresh(self, now):
+        return self.last_success is not None and now - self.last_success <= self.max_age
+
+    async def execute(self):
+        if self.pending is not None and not self.pending.done():
+            self.skip("previous run still in progress")
+            return
+
+        self.last_started = time.monotonic()
+        self.last_run_at = datetime.now()
+        self.runs += 1
+        start = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(self.func):
+                await asyncio.wait_for(self.func(), self.timeout)
+            else:
+                future = asyncio.get_running_loop().run_in_executor(None, self.func)
+                self.pending = future
+                # shield: on timeout the thread cannot be stopped, so keep its future
+                await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            self.last_success = time.monotonic()
+            self.last_status = "ok"
+            self.last_error = None
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.last_status = "timeout"
+            self.last_error = f"timed out after {self.timeout}s"
+        except Exception as e:
+            self.failures += 1
+            self.last_status = "failed"
+            self.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            self.last_duration = round(time.perf_counter() - start, 3)
+            self.total_duration += self.last_duration
+
+        if self.last_status != "ok":
+            print(f"Pipeline task '{self.name}' {self.last_status}: {self.last_error}")
+
+    def skip(self, reason):
+        self.skips += 1
+        self.last_status = "skipped"
+        self.last_error = reason
+
+    def status(self):
+        return {
+            "deps": self.deps,
+            "interval": round(self.interval, 1),
+            "interval_range": [self.adaptive.min_interval, self.adaptive.max_interval] if self.adaptive else None,
+            "jitter": self.jitter,
+            "timeout": self.timeout,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "last_run": self.last_run_at.strftime("%Y-%m-%d %H:%M:%S") if self.last_run_at else None,
+            "last_duration": self.last_duration,
+            "avg_duration": round(self.total_duration / self.runs, 3) if self.runs else None,
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skips": self.skips,
+        }
+
+
+class Pipeline:
+    def __init__(self):
+        self.tasks = {}
+        self.scheduler = None
+        self.triggered = set()  # dependents started and not finished yet
+        self.running = set()  # their asyncio tasks, referenced until done
+
+    def add(self, name, func, deps=(), interval=600.0, timeout=60.0, max_age=None, jitter=0, adaptive=None):
+        """Register a task. Dependencies on tasks that are never added (e.g.
+        a disabled subsystem) are ignored."""
+        self.tasks[name] = Task(name, func, deps, interval, timeout, max_age, jitter, adaptive)
+        return self.tasks[name]
+
+    def deps_of(self, task):
+        return [self.tasks[dep] for dep in task.deps if dep in self.tasks]
+
+    def schedule(self, scheduler):
+        """Add one job per source task to an APScheduler scheduler; the other
+        tasks are started by their dependencies."""
+        self.scheduler = scheduler
+        for task in self.tasks.values():
+            if self.deps_of(task):
+                continue
+            scheduler.add_job(
+                self.run_task,
+                self._trigger(task),
+                args=[task.name],
+                id=self._job_id(task),
+                coalesce=True,  # after a stall, run once instead of catching up
+                max_instances=1,
+                misfire_grace_time=max(int(task.interval), 1),
+            )
+
+    async def run_task(self, name):
+        task = self.tasks[name]
+        stale = [dep.name for dep in self.deps_of(task) if not dep.fresh(time.monotonic())]
+        if stale:
+            task.skip(f"stale inputs: {', '.join(stale)}")
+            return
+
+        await task.execute()
+        if task.last_status != "ok":
+            return
+
+        if task.adaptive:
+            interval = task.adaptive.next_interval(task.interval)
+            if abs(interval - task.interval) > 0.01 * task.interval:
+                task.interval = interval
+                if self.scheduler:
+                    self.scheduler.reschedule_job(self._job_id(task), trigger=self._trigger(task))
+        self._start_dependents(task)
+
+    def ready(self, task):
+        """Every dependency has succeeded since `task` last started."""
+        return all(
+            dep.last_success is not None
+            and (task.last_started is None or dep.last_success > task.last_started)
+            for dep in self.deps_of(task)
+        )
+
+    def _start_dependents(self, task):
+        for dependent in self.tasks.values():
+            if task.name not in dependent.deps or dependent.name in self.triggered:
+                continue
+            if self.ready(dependent):
+                self.triggered.add(dependent.name)
+                job = asyncio.create_task(self._run_dependent(dependent.name))
+                self.running.add(job)
+                job.add_done_callback(self.running.discard)
+
+    async def _run_dependent(self, name):
+        try:
+            await self.run_task(name)
+        finally:
+            self.triggered.discard(name)
+
+    @staticmethod
+    def _trigger(task):
+        return IntervalTrigger(seconds=task.interval, jitter=task.jitter or None)
+
+    @staticmethod
+    def _job_id(task):
+        return f"pipeline-{task.name}"
+
+    def status(self):
+        return {name: task.status() for name, task in self.tasks.items()}
+
+
+pipeline = Pipeline()
@@ -0,0 +1,233 @@
+"""Inference backends for the power-prediction model.
+
+The model is a small dense network (models/prediction_model.h5) between two
+fitted sklearn scalers (models/scaler_X.pkl, models/scaler_y.pkl). Only the
+"keras" backend needs TensorFlow; "numpy" runs the exported weights with plain
+matmuls and "onnx" uses ONNX Runtime when it is installed.
+
+    python -m app.utils.power_model export [--onnx]   # write the compact files
+    python -m app.utils.power_model check             # parity against Keras
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+KERAS_MODEL_PATH = os.path.join(MODEL_DIR, "prediction_model.h5")
+SCALER_X_PATH = os.path.join(MODEL_DIR, "scaler_X.pkl")
+SCALER_Y_PATH = os.path.join(MODEL_DIR, "scaler_y.pkl")
+NUMPY_MODEL_PATH = os.path.join(MODEL_DIR, "prediction_model.npz")
+ONNX_MODEL_PATH = os.path.join(MODEL_DIR, "prediction_model.onnx")
+
+# "auto" picks onnx, then numpy, then keras, depending on what is available
+POWER_MODEL_BACKEND = os.environ.get("POWER_MODEL_BACKEND", "auto").lower()
+
+DEFAULT_FEATURES = ['T_set', 'H_indoor', 'T_outdoor', 'H_outdoor', 'N']
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+    "elu": lambda x: np.where(x > 0, x, np.expm1(x)),
+    "softplus": lambda x: np.logaddexp(0, x),
+    "swish": lambda x: x / (1 + np.exp(-x)),
+    "silu": lambda x: x / (1 + np.exp(-x)),
+}
+
+
+def affine_from_scaler(scaler, n_features):
+    """Per-feature (scale, offset) so that scaler.transform(x) == x * scale + offset.
+
+    Holds for the sklearn scalers used for this model (Standard, MinMax,
+    MaxAbs, Robust), which are all feature-wise affine maps.
+    """
+    names = getattr(scaler, "feature_names_in_", None)
+
+    def transform(values):
+        if names is not None:
+            import pandas as pd
+            values = pd.DataFrame(values, columns=names)
+        return np.asarray(scaler.transform(values), dtype=np.float64)[0]
+
+    offset = transform(np.zeros((1, n_features)))
+    scale = transform(np.ones((1, n_features))) - offset
+    return scale, offset
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self):
+        import joblib
+        from tensorflow import keras
+
+        self.model = keras.models.load_model(KERAS_MODEL_PATH, compile=False)
+        self.scaler_X = joblib.load(SCALER_X_PATH)
+        self.scaler_y = joblib.load(SCALER_Y_PATH)
+        self.feature_names = list(getattr(self.scaler_X, "feature_names_in_", DEFAULT_FEATURES))
+
+    def predict_power(self, features):
+        import pandas as pd
+
+        features_df = pd.DataFrame(np.asarray(features, dtype=float), columns=self.feature_names)
+        scaled = self.scaler_X.transform(features_df)
+        pred_scaled = self.model.predict_on_batch(scaled)
+        return self.scaler_y.inverse_transform(np.reshape(pred_scaled, (-1, 1)))[:, 0]
+
+
+class NumpyBackend:
+    name = "numpy"
+
+    def __init__(self, path=NUMPY_MODEL_PATH):
+        data = np.load(path, allow_pickle=False)
+        self.feature_names = [str(name) for name in data["feature_names"]]
+        self.x_scale, self.x_offset = data["x_scale"], data["x_offset"]
+        self.y_scale, self.y_offset = data["y_scale"], data["y_offset"]
+        self.layers = [
+            (data[f"W{i}"], data[f"b{i}"], ACTIVATIONS[str(activation)])
+            for i, activation in enumerate(data["activations"])
+        ]
+
+    def predict_power(self, features):
+        x = np.asarray(features, dtype=np.float64) * self.x_scale + self.x_offset
+        for weights, bias, activation in self.layers:
+            x = activation(x @ weights + bias)
+        return (x[:, 0] - self.y_offset[0]) / self.y_scale[0]
+
+
+class OnnxBackend(NumpyBackend):
+    """ONNX Runtime for the network, scalers from the numpy export."""
+
+    name = "onnx"
+
+    def __init__(self, path=ONNX_MODEL_PATH):
+        import onnxruntime
+
+        super().__init__()
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_power(self, features):
+        x = np.asarray(features, dtype=np.float64) * self.x_scale + self.x_offset
+        output = self.session.run(None, {self.input_name: x.astype(np.float32)})[0]
+        return (np.reshape(output, -1).astype(np.float64) - self.y_offset[0]) / self.y_scale[0]
+
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "numpy": NumpyBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def load_backend(name=POWER_MODEL_BACKEND):
+    if name == "auto":
+        if importlib.util.find_spec("onnxruntime") and os.path.exists(ONNX_MODEL_PATH) \
+                and os.path.exists(NUMPY_MODEL_PATH):
+            name = "onnx"
+        elif os.path.exists(NUMPY_MODEL_PATH):
+            name = "numpy"
+        else:
+            name = "keras"
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown POWER_MODEL_BACKEND '{name}', expected one of {['auto', *BACKENDS]}")
+    backend = BACKENDS[name]()
+    print(f"✅ Power model loaded with the {backend.name} backend")
+    return backend
+
+
+def export(onnx=False):
+    """Write the numpy export (and optionally ONNX) next to the Keras model."""
+    keras_backend = KerasBackend()
+    n_features = len(keras_backend.feature_names)
+
+    arrays = {}
+    activations = []
+    for layer in keras_backend.model.layers:
+        kind = layer.__class__.__name__
+        if kind in ("InputLayer", "Dropout"):
+            continue
+        if kind != "Dense":
+            raise ValueError(f"Layer '{layer.name}' ({kind}) is not supported by the numpy backend")
+        activation = layer.activation.__name__
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Activation '{activation}' is not supported by the numpy backend")
+
+        weights, bias = layer.get_weights()
+        arrays[f"W{len(activations)}"] = weights.astype(np.float64)
+        arrays[f"b{len(activations)}"] = bias.astype(np.float64)
+        activations.append(activation)
+
+    x_scale, x_offset = affine_from_scaler(keras_backend.scaler_X, n_features)
+    y_scale, y_offset = affine_from_scaler(keras_backend.scaler_y, 1)
+
+    np.savez(
+        NUMPY_MODEL_PATH,
+        feature_names=np.array(keras_backend.feature_names),
+        activations=np.array(activations),
+        x_scale=x_scale, x_offset=x_offset,
+        y_scale=y_scale, y_offset=y_offset,
+        **arrays,
+    )
+    print(f"Wrote {NUMPY_MODEL_PATH} ({len(activations)} dense layers)")
+
+    if onnx:
+        import tensorflow as tf
+        import tf2onnx
+
+        signature = (tf.TensorSpec((None, n_features), tf.float32, name="features"),)
+        tf2onnx.convert.from_keras(keras_backend.model, input_signature=signature, output_path=ONNX_MODEL_PATH)
+        print(f"Wrote {ONNX_MODEL_PATH}")
+
+
+def check(samples=1000, tolerance=1e-3):
+    """Compare every exported backend with Keras on random inputs. Returns True on parity."""
+    reference = KerasBackend()
+    rng = np.random.default_rng(0)
+    # Plausible ranges for T_set, humidity, temperature and occupancy
+    low = {"T_set": 16, "H_indoor": 20, "T_outdoor": 20, "H_outdoor": 20, "N": 0}
+    high = {"T_set": 30, "H_indoor": 95, "T_outdoor": 40, "H_outdoor": 100, "N": 40}
+    features = np.column_stack([
+        rng.uniform(low.get(name, 0), high.get(name, 1), samples) for name in reference.feature_names
+    ])
+    expected = reference.predict_power(features)
+
+    ok = True
+    for name, backend_class in BACKENDS.items():
+        if name == "keras":
+            continue
+        try:
+            backend = backend_class()
+        except (FileNotFoundError, ImportError) as e:
+            print(f"{name:<6} skipped ({e})")
+            continue
+        diff = np.abs(backend.predict_power(features) - expected)
+        # relative to the size of the predictions, in Watts
+        passed = diff.max() <= tolerance * max(1.0, np.abs(expected).max())
+        ok = ok and passed
+        print(f"{name:<6} max abs diff {diff.max():.6f} W  {'OK' if passed else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or check the power-prediction model backends.")
+    parser.add_argument("command", choices=["export", "check"])
+    parser.add_argument("--onnx", action="store_true", help="also export ONNX (needs tf2onnx)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(onnx=args.onnx)
+    elif not check():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""EXPLAIN QUERY PLAN check for the hot read paths.
+
+Runs the queries behind the listing, status and chart endpoints against the
+configured database, captures the SQL they send and asks SQLite for the plan
+of each. Exits with status 1 when any of them scans a whole table, so it can
+guard schema/query changes in CI or after `alembic upgrade head`:
+
+    python -m app.utils.query_plan [-v]
+"""
+import argparse
+import re
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import event
+
+from ..database import Base, Sessionlocal, engine
+from ..models import (
+    Pzem, AHT10, Camera, OpenWeather, DataAnalysis, RecommendationLog, EmissionLog, PMVLog,
+    PzemAggregate, PzemEvent,
+)
+from ..service import ac_temp, emission, pmv, rollup
+from .aggregation import aggregate
+from .pagination import encode_cursor, paginate
+from .state_store import state_store
+
+LISTED_MODELS = [Pzem, AHT10, Camera, OpenWeather, EmissionLog, PMVLog, RecommendationLog, PzemAggregate, PzemEvent]
+LATEST_MODELS = [Pzem, AHT10, Camera, OpenWeather, DataAnalysis, RecommendationLog, EmissionLog, PMVLog]
+
+# "SCAN pzem" is a full scan; "SCAN pzem USING INDEX ..." walks an index in order
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+
+
+def hot_paths():
+    """(name, function of a session) for every read path worth guarding."""
+    now = datetime.now()
+    cursor = encode_cursor(SimpleNamespace(timestamp=now, id=1))
+    paths = []
+    for model in LISTED_MODELS:
+        name = model.__tablename__
+        paths += [
+            (f"{name} page 1", lambda db, m=model: paginate(db, m, 1)),
+            (f"{name} keyset page", lambda db, m=model: paginate(db, m, cursor=cursor)),
+        ]
+    for model in LATEST_MODELS:
+        paths.append((
+            f"{model.__tablename__} latest",
+            lambda db, m=model: db.query(m).order_by(m.timestamp.desc()).first(),
+        ))
+    paths += [
+        ("pzem device page", lambda db: paginate(db, Pzem, 1, filters=[Pzem.device == "main"])),
+        ("pzem device keyset page", lambda db: paginate(db, Pzem, cursor=cursor, filters=[Pzem.device == "main"])),
+        ("pzem device latest", lambda db: state_store.latest(db, Pzem, "lighting")),
+        ("pzem device 5m buckets", lambda db: aggregate(db, Pzem, now - timedelta(days=1), now, "5m", device="lighting")),
+        ("emission status", lambda db: (emission.latest_emission(db), emission.total_emission(db))),
+        ("recent pmv logs", pmv.get_recent_pmv_logs),
+        ("last T_set", ac_temp.get_last_tset),
+        ("pzem raw history", lambda db: aggregate(db, Pzem, now - timedelta(days=1), now, "raw")),
+        ("pzem 5m buckets", lambda db: aggregate(db, Pzem, now - timedelta(days=1), now, "5m")),
+        ("aht10 hourly rollup", lambda db: aggregate(db, AHT10, now - timedelta(days=7), now, "1h")),
+        ("rollup series", lambda db: rollup.series(db, "power", "day", now - timedelta(days=30), now)),
+    ]
+    return paths
+
+
+def capture(function):
+    """Run `function` with a session and return the SELECT statements it sent."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    db = Sessionlocal()
+    try:
+        function(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+
+def full_scans(plan, tables):
+    scans = []
+    for row in plan:
+        match = FULL_SCAN.match(row[-1])
+        if match and match.group(1) in tables:
+            scans.append(row[-1])
+    return scans
+
+
+def check(verbose=False):
+    """Print the verdict for every hot path. Returns True when none does a full table scan."""
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("The query plan check only supports SQLite")
+
+    tables = set(Base.metadata.tables)
+    ok = True
+    for name, function in hot_paths():
+        problems = []
+        plans = []
+        for statement, parameters in capture(function):
+            with engine.connect() as conn:
+                plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+            plans.append((statement, plan))
+            problems += full_scans(plan, tables)
+
+        ok = ok and not problems
+        print(f"{'FULL SCAN' if problems else 'ok':<10} {name}" + (f"  ({', '.join(problems)})" if problems else ""))
+        if verbose or problems:
+            for statement, plan in plans:
+                print("    " + " ".join(statement.split()))
+                for row in plan:
+                    print(f"      {row[-1]}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail on full table scans in the hot queries.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every statement and its plan")
+    args = parser.parse_args()
+    if not check(args.verbose):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Latest reading of every sensor stream, kept in memory.
+
+Writers (ingest, the emission/PMV/interest services, the T_set and
+recommendation endpoints) record each new row after it is committed, or
+when it is queued on the write-behind buffer. Readers call latest(), which
+answers from memory and only falls back to `ORDER BY timestamp DESC LIMIT 1`
+on the first read or after a stream was invalidated by an update/delete.
+
+Tables with a device column (pzem) keep one stream per device; the primary
+device's stream is the one readers get by default.
+"""
+import os
+import threading
+from datetime import datetime
+
+from ..models import PRIMARY_DEVICE
+
+# Readings older than this are flagged stale in get()/snapshot()
+STATE_MAX_AGE = float(os.environ.get("STATE_MAX_AGE", 1200))  # seconds, two scheduler ticks
+
+
+def _key(model, device=None):
+    """Stream name: the table, suffixed with the device unless it is the primary one."""
+    if device is None or device == PRIMARY_DEVICE:
+        return model.__tablename__
+    return f"{model.__tablename__}:{device}"
+
+
+def _columns(model, row):
+    names = [column.name for column in model.__table__.columns]
+    if isinstance(row, dict):
+        return {name: row.get(name) for name in names}
+    return {name: getattr(row, name) for name in names}
+
+
+class StateStore:
+    def __init__(self, max_age=STATE_MAX_AGE):
+        self.max_age = max_age
+        self.entries = {}  # table name -> (model, column values)
+        self.lock = threading.Lock()
+        self.version = 0  # bumped on every change, identifies a snapshot
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, model, row):
+        """Store `row` (ORM object or dict) as the latest of its stream, unless a
+        newer reading is already there."""
+        values = _columns(model, row)
+        if values.get("timestamp") is None:
+            values["timestamp"] = datetime.now()
+        name = _key(model, values.get("device"))
+        with self.lock:
+            current = self.entries.get(name)
+            if current is not None and current[1]["timestamp"] > values["timestamp"]:
+                return
+            self.entries[name] = (model, values)
+            self.version += 1
+
+    def invalidate(self, model):
+        """Forget every stream of a table, e.g. after its rows were edited or deleted."""
+        table = model.__tablename__
+        with self.lock:
+            names = [name for name in self.entries if name == table or name.startswith(table + ":")]
+            for name in names:
+                del self.entries[name]
+            if names:
+                self.version += 1
+
+    def latest(self, db, model, device=None):
+        """The newest row of `model` (of `device`, or the primary device), or
+        None if there is none.
+
+        Returns an unattached model instance when served from memory, so
+        callers must not modify it expecting the change to be saved.
+        """
+        with self.lock:
+            entry = self.entries.get(_key(model, device))
+            if entry is not None:
+                self.hits += 1
+                return model(**entry[1])
+            self.misses += 1
+
+        query = db.query(model)
+        if hasattr(model, "device"):
+            query = query.filter(model.device == (device or PRIMARY_DEVICE))
+        row = query.order_by(model.timestamp.desc()).first()
+        if row is not None:
+            self.record(model, row)
+        return row
+
+    def _describe(self, values, now):
+        age = (now - values["timestamp"]).total_seconds()
+        return {
+            "values": {
+                key: value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value
+                for key, value in values.items()
+            },
+            "age": round(age, 1),
+            "stale": age > self.max_age,
+        }
+
+    def get(self, model, device=None):
+        with self.lock:
+            entry = self.entries.get(_key(model, device))
+        return self._describe(entry[1], datetime.now()) if entry else None
+
+    def snapshot(self):
+        """Every stream at one instant (taken under the lock, so no stream can
+        change halfway through)."""
+        with self.lock:
+            entries = {name: dict(values) for name, (model, values) in self.entries.items()}
+            version = self.version
+        now = datetime.now()
+        return {
+            "version": version,
+            "taken_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "streams": {name: self._describe(values, now) for name, values in entries.items()},
+        }
+
+    def status(self):
+        with self.lock:
+            return {
+                "streams": len(self.entries),
+                "max_age": self.max_age,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+state_store = StateStore()
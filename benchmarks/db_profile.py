@@ -0,0 +1,93 @@
+"""Concurrent read/write throughput of the SQLite profiles in app/database.py.
+
+Writers insert AHT10 readings with one commit each (like /aht10/create with
+WRITE_BEHIND=0), readers run the dashboard query (latest page + count).
+
+    python -m benchmarks.db_profile --seconds 10 --writers 2 --readers 4
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
+
+from app.database import create_db_engine, Base
+from app.models import AHT10
+
+
+def run_profile(profile, seconds, writers, readers, seed_rows):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_{profile}.db")
+    engine = create_db_engine(f"sqlite:///{path}", profile)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    with Session() as db:
+        db.bulk_insert_mappings(AHT10, [{"temperature": 25.0, "humidity": 60.0}] * seed_rows)
+        db.commit()
+
+    counts = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def writer():
+        while time.monotonic() < stop:
+            db = Session()
+            try:
+                db.add(AHT10(temperature=25.0, humidity=60.0))
+                db.commit()
+                key = "writes"
+            except OperationalError:
+                db.rollback()
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                counts[key] += 1
+
+    def reader():
+        while time.monotonic() < stop:
+            db = Session()
+            try:
+                db.query(AHT10).order_by(AHT10.timestamp.desc()).limit(10).all()
+                db.query(AHT10).count()
+                key = "reads"
+            except OperationalError:
+                key = "errors"
+            finally:
+                db.close()
+            with lock:
+                counts[key] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    engine.dispose()
+    return {
+        "writes/s": round(counts["writes"] / seconds, 1),
+        "reads/s": round(counts["reads"] / seconds, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seed-rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    for profile in ("default", "production"):
+        result = run_profile(profile, args.seconds, args.writers, args.readers, args.seed_rows)
+        print(f"{profile:<12} {result}")
+
+
+if __name__ == "__main__":
+    main()
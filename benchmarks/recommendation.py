@@ -0,0 +1,90 @@
+"""Latency of recommend_optimal_T_set: one predict per candidate vs one batched pass.
+
+Needs the files in models/ (see README). The numpy backend is timed too once
+`python -m app.utils.power_model export` has been run.
+
+    python -m benchmarks.recommendation --runs 50
+
+Measured with --runs 100 on a 1 vCPU dev box (Python 3.11, TensorFlow 2.21,
+Keras 3.15). models/ is not in the repository, so the model was a stand-in of
+similar size: Dense 5-64-32-1 (ReLU) between MinMax scalers. Candidates
+17..20, current T_set 21:
+
+    per-candidate keras   median 536.9 ms   p95 583.0 ms   (before)
+    batched keras         median   3.0 ms   p95   3.5 ms
+    batched numpy         median   0.04 ms  p95   0.04 ms
+
+Nearly all of the per-candidate time is the fixed overhead of each
+model.predict() call, so the ratio should hold for the production model;
+rerun with the real files to confirm.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.routers.analysis import recommend_optimal_T_set, T_SET_MIN, T_SET_MAX
+from app.utils.power_model import load_backend, NUMPY_MODEL_PATH
+
+REAL_TIME_DATA = {"H_indoor": 62.0, "T_outdoor": 31.5, "H_outdoor": 70.0, "N": 8}
+CURRENT_T_SET = 21
+CURRENT_POWER = 1800.0
+
+
+def recommend_per_candidate(model, scaler_X, scaler_y, real_time_data, current_T_set, current_actual_power):
+    """The previous implementation: a DataFrame, transform and predict per candidate."""
+    feature_order = scaler_X.feature_names_in_ if hasattr(scaler_X, 'feature_names_in_') else ['T_set', 'H_indoor', 'T_outdoor', 'H_outdoor', 'N']
+    candidates = []
+    for T_set_candidate in range(T_SET_MIN, T_SET_MAX + 1):
+        if T_set_candidate == current_T_set:
+            continue
+        feature_values = [
+            T_set_candidate if name == 'T_set' else real_time_data.get(name, 0)
+            for name in feature_order
+        ]
+        features_df = pd.DataFrame([feature_values], columns=feature_order)
+        features_scaled = scaler_X.transform(features_df)
+        pred_power_scaled = model.predict(features_scaled, verbose=0)
+        pred_power = scaler_y.inverse_transform(pred_power_scaled)[0][0]
+        if pred_power < current_actual_power:
+            candidates.append((T_set_candidate, pred_power))
+    return min(candidates, key=lambda x: x[1]) if candidates else None
+
+
+def time_runs(func, runs):
+    func()  # warm-up, graph tracing
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(float(np.percentile(samples, 95)), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    keras_backend = load_backend("keras")
+    legacy_args = (keras_backend.model, keras_backend.scaler_X, keras_backend.scaler_y,
+                   REAL_TIME_DATA, CURRENT_T_SET, CURRENT_POWER)
+    batched_args = (REAL_TIME_DATA, CURRENT_T_SET, CURRENT_POWER)
+
+    print(f"candidates          {T_SET_MIN}..{T_SET_MAX}")
+    print(f"per-candidate keras {time_runs(lambda: recommend_per_candidate(*legacy_args), args.runs)}")
+    print(f"batched keras       {time_runs(lambda: recommend_optimal_T_set(keras_backend, *batched_args), args.runs)}")
+
+    if os.path.exists(NUMPY_MODEL_PATH):
+        numpy_backend = load_backend("numpy")
+        print(f"batched numpy       {time_runs(lambda: recommend_optimal_T_set(numpy_backend, *batched_args), args.runs)}")
+
+
+if __name__ == "__main__":
+    main()
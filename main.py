@@ -1,3 +1,4 @@
+import asyncio
 import subprocess
 import uvicorn
 import os
@@ -9,11 +10,38 @@ from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
 from fastapi_tailwind import tailwind
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from dotenv import load_dotenv
 
-from app.models import Base
+from app.models import Base, Pzem, Camera
 from app.database import engine
-from app.routers import pzem, aht10, camera, openweather, analysis, carbonemission, actemp, pmvashrae, insight
-from app.service import open_weather, pzem_sensor, web_cam, interest, emission, pmv
+from app.service import open_weather, pzem_sensor, interest, emission, retention, rollup
+from app.service.write_buffer import write_buffer, WRITE_BEHIND
+from app.service.pzem_poller import pzem_poller, PZEM_POLLING
+from app.utils.import_profile import timed_import
+from app.utils.pipeline import pipeline, AdaptiveInterval
+from app.utils.state_store import state_store
+from app.utils.modbus_manager import modbus_sessions
+
+load_dotenv(override=True)
+
+# Heavy subsystems can be switched off on machines without the hardware/model files
+ENABLE_CAMERA = os.environ.get("ENABLE_CAMERA", "1") == "1"  # cv2, torch, imageai
+ENABLE_ANALYSIS = os.environ.get("ENABLE_ANALYSIS", "1") == "1"  # power-prediction model
+ENABLE_PMV = os.environ.get("ENABLE_PMV", "1") == "1"  # pythermalcomfort
+WARM_UP = os.environ.get("WARM_UP", "1") == "1"  # load models in the background after startup
+SERVICE_INTERVAL = float(os.environ.get("SERVICE_INTERVAL", 600))  # default seconds between service runs
+SERVICE_JITTER = float(os.environ.get("SERVICE_JITTER", 5))  # default random delay, spreads the jobs out
+RETENTION_INTERVAL_HOURS = float(os.environ.get("RETENTION_INTERVAL_HOURS", 24))
+
+ROUTERS = ["pzem", "aht10", "camera", "openweather", "analysis", "carbonemission", "actemp", "pmvashrae", "insight", "system"]
+DISABLED_ROUTERS = {
+    "camera": not ENABLE_CAMERA,
+    "analysis": not ENABLE_ANALYSIS,
+    "pmvashrae": not ENABLE_PMV,
+}
+
+web_cam = timed_import("app.service.web_cam") if ENABLE_CAMERA else None
+pmv = timed_import("app.service.pmv") if ENABLE_PMV else None
 
 
 LOCATION = "Depok,ID"
@@ -33,43 +61,95 @@ def run_migrations():
 run_migrations()  # Ensure DB is up to date
 
 Base.metadata.create_all(bind=engine)
+rollup.check_dialect(engine)  # fail now, not on every insert
 
 static_files = StaticFiles(directory="app/static")
 
-async def run_service():
+async def collect_weather():
+    await open_weather.get_weather(API_KEY, LAT, LON)
+
+async def derive_interest():
+    # Make sure the collected readings are in the database before deriving from them
+    await write_buffer.flush()
+    await asyncio.to_thread(interest.get_interest_data)
+
+def service_setting(task, name, default):
+    """Per-task override, e.g. PZEM_INTERVAL=30 or WEBCAM_MIN_INTERVAL=60."""
+    return float(os.environ.get(f"{task.upper()}_{name}", default))
+
+def latest_value(model, column):
+    def read():
+        entry = state_store.get(model)
+        return entry["values"].get(column) if entry and not entry["stale"] else None
+    return read
+
+def add_service(name, func, interval, deps=(), timeout=60, watch=None):
+    """Register a service with its interval/jitter from the environment. With
+    `watch`, the interval adapts between <NAME>_MIN_INTERVAL and <NAME>_MAX_INTERVAL."""
+    interval = service_setting(name, "INTERVAL", interval)
+    adaptive = None
+    if watch and os.environ.get(f"{name.upper()}_ADAPTIVE", "1") == "1":
+        adaptive = AdaptiveInterval(
+            watch,
+            min_interval=service_setting(name, "MIN_INTERVAL", interval / 4),
+            max_interval=service_setting(name, "MAX_INTERVAL", interval * 4),
+            threshold=service_setting(name, "CHANGE_THRESHOLD", 0.1),
+        )
+    pipeline.add(
+        name, func, deps=deps, timeout=timeout, adaptive=adaptive,
+        interval=interval,
+        jitter=service_setting(name, "JITTER", SERVICE_JITTER),
+    )
+
+def build_pipeline():
+    """The collectors are scheduled jobs. The derived steps run once all of
+    their inputs have been collected again, so each cycle uses its own samples
+    (their interval only sets how long their output counts as fresh)."""
+    add_service("openweather", collect_weather, interval=SERVICE_INTERVAL, timeout=30)
+    # Power and occupancy are sampled faster while they change, slower while stable.
+    # With PZEM_POLLING the poller samples continuously and stores the readings itself.
+    if not PZEM_POLLING:
+        add_service("pzem", pzem_sensor.read_pzem_data, interval=30, timeout=30, watch=latest_value(Pzem, "power"))
+    if web_cam:
+        add_service("webcam", web_cam.people_counter, interval=120, timeout=120, watch=latest_value(Camera, "occupant"))
+    add_service("interest", derive_interest, deps=["openweather", "pzem", "webcam"], interval=SERVICE_INTERVAL)
+    add_service("emission", emission.log_emission, deps=["interest"], interval=SERVICE_INTERVAL)
+    if pmv:
+        add_service("pmv", pmv.calculate_and_log_pmv, deps=["interest"], interval=SERVICE_INTERVAL)
+
+async def warm_up():
+    """Initialise the heavy subsystems in the background so the server starts right away."""
+    loaders = []
+    if ENABLE_ANALYSIS:
+        loaders.append(("power model", timed_import("app.routers.analysis").get_power_model, None))
+    if ENABLE_PMV:
+        loaders.append(("PMV model", pmv.load_model, None))
+    if ENABLE_CAMERA:
+        from app.utils.camera_manager import camera_registry
+        from app.utils.detector_manager import people_detector
+
+        loaders.append(("camera", camera_registry.get, None))
+        if os.environ.get("DETECTION_PRELOAD", "1") == "1":
+            # Pakai executor detektor agar deteksi pertama menunggu model selesai dimuat
+            loaders.append(("detection model", people_detector.load, people_detector.executor))
+
+    loop = asyncio.get_running_loop()
+    for name, loader, executor in loaders:
+        try:
+            await loop.run_in_executor(executor, loader)
+        except Exception as e:
+            print(f"Failed to warm up {name}: {e}")
+
+async def run_retention():
     try:
-        await open_weather.get_weather(API_KEY, LAT, LON)
+        await asyncio.to_thread(retention.run)
     except Exception as e:
-        print(f"Failed to run Open Weather service: {e}")
+        print(f"Failed to run Retention service: {e}")
 
-    try:
-        await pzem_sensor.read_pzem_data()
-    except Exception as e:
-        print(f"Failed to run PZEM service: {e}")
-
-    try:
-        await web_cam.people_counter()
-    except Exception as e:
-        print(f"Failed to run WebCam service: {e}")
-
-    try:
-        interest.get_interest_data()
-    except Exception as e:
-        print(f"Failed to run Interest service: {e}")
-
-    try:
-        emission.log_emission()
-    except Exception as e:
-        print(f"Failed to run Emission service: {e}")
-
-    try:
-        pmv.calculate_and_log_pmv()
-    except Exception as e:
-        print(f"Failed to run PMV service: {e}")
-        
 def run_scheduler():
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(run_service, 'interval', minutes=10)
+    pipeline.schedule(scheduler)
+    scheduler.add_job(run_retention, 'interval', hours=RETENTION_INTERVAL_HOURS)
     scheduler.start()
 
 @asynccontextmanager
@@ -77,12 +157,23 @@ async def lifespan(app: FastAPI):
     # Proses startup
     print("Starting up...")
     process = tailwind.compile(static_files.directory + "/css/output.css", watch=True)
+    if WRITE_BEHIND:
+        write_buffer.start()
+    if PZEM_POLLING:
+        pzem_poller.start()
+    warm_up_task = asyncio.create_task(warm_up()) if WARM_UP else None  # Muat model di background
+    build_pipeline()
     run_scheduler()  # Menjalankan scheduler saat startup
 
     yield  # Aplikasi berjalan di sini
 
     # Proses shutdown
     print("Shutting down...")
+    if warm_up_task:
+        warm_up_task.cancel()
+    await pzem_poller.stop()  # Simpan interval terakhir
+    await write_buffer.stop()  # Tulis sisa data di buffer sebelum keluar
+    modbus_sessions.close_all()
     process.terminate()  # Menghentikan proses Tailwind CSS
 
 app = FastAPI(lifespan=lifespan)
@@ -105,15 +196,11 @@ app.mount("/images", StaticFiles(directory="images"), name="images")
 async def read_root(request: Request):
     return templates.TemplateResponse(request, "home.html")
 
-app.include_router(pzem.router)
-app.include_router(aht10.router)
-app.include_router(camera.router)
-app.include_router(openweather.router)
-app.include_router(analysis.router)
-app.include_router(carbonemission.router)
-app.include_router(actemp.router)
-app.include_router(pmvashrae.router)
-app.include_router(insight.router)
+for name in ROUTERS:
+    if DISABLED_ROUTERS.get(name):
+        print(f"Router '{name}' disabled by feature flag")
+        continue
+    app.include_router(timed_import(f"app.routers.{name}").router)
 
 def main():
 
@@ -0,0 +1,29 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# app.database builds its engine at import time, so point it at a scratch
+# database before any test module imports the app
+DATABASE_DIR = tempfile.mkdtemp(prefix="server_iot_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_DIR}/test.db"
+os.environ["WRITE_BEHIND"] = "0"
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="session")
+def database():
+    """The schema as main.py builds it: the migrations, then create_all."""
+    from alembic import command
+    from alembic.config import Config
+
+    from app.database import Base, engine
+    import app.models  # noqa: F401  (registers the tables)
+
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    command.upgrade(config, "head")
+    Base.metadata.create_all(bind=engine)
+    return engine
@@ -0,0 +1,128 @@
+"""Simulated RS-485 bus of PZEM-004T meters, for the tests.
+
+Every slave ID answers with plausible, slowly drifting readings, and every
+few minutes a meter switches an AC compressor on or off, with a short inrush
+spike. Slave IDs in `offline` never answer, to exercise the per-device
+timeouts. Install it in place of the serial port with:
+
+    modbus_sessions.sessions[MODBUS_PORT] = SimulatedSession(MODBUS_PORT, offline={3})
+"""
+import random
+import time
+
+from modbus_tk.exceptions import ModbusError, ModbusInvalidResponseError
+
+from app.utils.modbus_manager import ModbusSession
+
+READ_INPUT_REGISTERS = 0x04
+RESET_ENERGY = 0x42
+
+FRAME_TIME = 0.03  # seconds a request/response takes on the bus at 9600 baud
+COMPRESSOR_WATTS = 800.0
+INRUSH_SECONDS = 3.0
+
+
+class SimulatedMeter:
+    def __init__(self, slave_id):
+        self.random = random.Random(slave_id)
+        self.base_load = 50.0 * slave_id
+        self.load = self.base_load
+        self.compressor_since = None  # monotonic, while the compressor runs
+        self.energy = 0.0  # Wh
+        self.updated = time.monotonic()
+
+    def registers(self):
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+
+        # Drift the background load; switch the compressor now and then
+        self.load = max(self.load + self.random.gauss(0, 2), 0.2 * self.base_load)
+        if self.compressor_since is None and self.random.random() < elapsed / 300:
+            self.compressor_since = now
+        elif self.compressor_since is not None and self.random.random() < elapsed / 600:
+            self.compressor_since = None
+
+        power = self.load
+        if self.compressor_since is not None:
+            inrush = now - self.compressor_since < INRUSH_SECONDS
+            power += COMPRESSOR_WATTS * (2.5 if inrush else 1.0)
+        self.energy += power * elapsed / 3600
+
+        voltage = 220 + self.random.gauss(0, 1.5)
+        power_factor = 0.9 + self.random.uniform(-0.05, 0.05)
+        current = power / (voltage * power_factor)
+
+        current_raw = round(current * 1000)
+        power_raw = round(power * 10)
+        energy_raw = int(self.energy)
+        return (
+            round(voltage * 10),
+            current_raw & 0xFFFF, current_raw >> 16,
+            power_raw & 0xFFFF, power_raw >> 16,
+            energy_raw & 0xFFFF, energy_raw >> 16,
+            round((50 + self.random.gauss(0, 0.02)) * 10),
+            round(power_factor * 100),
+            0,  # alarm status
+        )
+
+
+class SimulatedBus:
+    """Stands in for both the serial connection and the RTU master."""
+
+    def __init__(self, offline=(), frame_time=FRAME_TIME):
+        self.offline = set(offline)
+        self.frame_time = frame_time
+        self.meters = {}
+        self.timeout = 1.0
+        self.response = b""
+        self.requests = []  # (slave id, function code), oldest first
+
+    def _meter(self, slave_id, function_code):
+        self.requests.append((slave_id, function_code))
+        if slave_id in self.offline:
+            time.sleep(self.timeout)
+            raise ModbusInvalidResponseError("Response length is invalid 0")
+        return self.meters.setdefault(slave_id, SimulatedMeter(slave_id))
+
+    # RtuMaster interface
+    def set_timeout(self, timeout):
+        self.timeout = timeout
+
+    def set_verbose(self, verbose):
+        pass
+
+    def execute(self, slave_id, function_code, address, length):
+        time.sleep(self.frame_time)
+        meter = self._meter(slave_id, function_code)
+        if function_code != READ_INPUT_REGISTERS:
+            raise ModbusError(1)  # illegal function
+        return meter.registers()[address:address + length]
+
+    # Serial interface, used for the raw energy reset frame
+    def reset_input_buffer(self):
+        self.response = b""
+
+    def write(self, frame):
+        time.sleep(self.frame_time)
+        slave_id, function_code = frame[0], frame[1]
+        meter = self._meter(slave_id, function_code)
+        if function_code == RESET_ENERGY:
+            meter.energy = 0.0
+            self.response = bytes(frame)  # the meter echoes the command
+
+    def read(self, size):
+        response, self.response = self.response[:size], self.response[size:]
+        return response
+
+    def close(self):
+        pass
+
+
+class SimulatedSession(ModbusSession):
+    def __init__(self, port, offline=(), frame_time=FRAME_TIME, **kwargs):
+        super().__init__(port, **kwargs)
+        self.bus = SimulatedBus(offline, frame_time)
+
+    def _open(self):
+        self.bus.set_timeout(self.timeout)
+        return self.bus, self.bus
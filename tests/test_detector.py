@@ -0,0 +1,32 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.detector_manager import people_detector
+
+
+def test_timed_out_worker_keeps_its_slot(monkeypatch):
+    def detect_people(frame):
+        time.sleep(frame)
+        return [(0, 0, 10, 10, 0.9)]
+
+    monkeypatch.setattr(people_detector, "detect_people", detect_people)
+    monkeypatch.setattr(people_detector, "slots", None)
+    completed = people_detector.completed
+
+    async def run():
+        assert await people_detector.run(0, timeout=1) == [(0, 0, 10, 10, 0.9)]
+        assert people_detector.completed == completed + 1
+
+        with pytest.raises(asyncio.TimeoutError):
+            await people_detector.run(0.3, timeout=0.05)
+        status = people_detector.status()
+        assert (status["in_flight"], status["abandoned"]) == (1, 1)
+        assert status["completed"] == completed + 1
+
+        await asyncio.sleep(0.4)
+        status = people_detector.status()
+        assert (status["in_flight"], status["abandoned"]) == (0, 0)
+
+    asyncio.run(run())
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from app.database import Sessionlocal
+from app.models import Pzem
+from app.service import ingest
+from app.utils.pagination import paginate, row_counts
+
+
+def add_reading(device):
+    ingest.insert_reading(Pzem, {
+        "timestamp": datetime.now(), "device": device, "voltage": 220.0, "current": 1.0,
+        "power": 200.0, "energy": 1.0, "frequency": 50.0, "power_factor": 0.9,
+    })
+
+
+def test_filtered_totals_are_cached_per_filter(database):
+    for device in ["pagination-a", "pagination-a", "pagination-b"]:
+        add_reading(device)
+
+    db = Sessionlocal()
+    try:
+        _, meta_a = paginate(db, Pzem, filters=[Pzem.device == "pagination-a"])
+        _, meta_b = paginate(db, Pzem, filters=[Pzem.device == "pagination-b"])
+        assert (meta_a["total_records"], meta_b["total_records"]) == (2, 1)
+
+        add_reading("pagination-a")
+        # Served from the cache until the next refresh
+        _, meta = paginate(db, Pzem, filters=[Pzem.device == "pagination-a"])
+        assert meta["total_records"] == 2
+
+        row_counts.invalidate("pzem")
+        _, meta = paginate(db, Pzem, filters=[Pzem.device == "pagination-a"])
+        assert meta["total_records"] == 3
+    finally:
+        db.close()
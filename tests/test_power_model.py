@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.utils import power_model
+
+pytest.importorskip("tensorflow")
+pytestmark = pytest.mark.skipif(
+    not all(os.path.exists(path) for path in (
+        power_model.KERAS_MODEL_PATH, power_model.SCALER_X_PATH, power_model.SCALER_Y_PATH
+    )),
+    reason=f"no Keras model in {power_model.MODEL_DIR}",
+)
+
+FEATURES = {
+    "T_set": [16, 17, 20, 24, 30],
+    "H_indoor": [20, 45.5, 60, 80, 95],
+    "T_outdoor": [20, 27.3, 31, 35, 40],
+    "H_outdoor": [20, 55, 70, 90, 100],
+    "N": [0, 1, 12, 25, 40],
+}
+
+
+def fixed_inputs(feature_names):
+    return np.column_stack([FEATURES[name] for name in feature_names]).astype(float)
+
+
+def test_numpy_export_matches_keras(tmp_path, monkeypatch):
+    path = str(tmp_path / "prediction_model.npz")
+    monkeypatch.setattr(power_model, "NUMPY_MODEL_PATH", path)
+    power_model.export()
+
+    keras_backend = power_model.KerasBackend()
+    numpy_backend = power_model.NumpyBackend(path)
+    assert numpy_backend.feature_names == keras_backend.feature_names
+
+    features = fixed_inputs(keras_backend.feature_names)
+    np.testing.assert_allclose(
+        numpy_backend.predict_power(features), keras_backend.predict_power(features), rtol=1e-4, atol=1e-2
+    )
+
+
+def test_check_reports_parity():
+    assert power_model.check()
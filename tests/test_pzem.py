@@ -0,0 +1,192 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("modbus_tk")
+pytest.importorskip("serial")
+
+from modbus_tk.exceptions import ModbusInvalidResponseError
+from sqlalchemy.exc import OperationalError
+
+from app.database import Sessionlocal
+from app.models import Pzem, PzemAggregate, PzemEvent
+from app.service import ingest, pzem_poller, pzem_sensor
+from app.service.pzem_poller import PzemPoller
+from app.utils.modbus_manager import MODBUS_PORT, modbus_sessions
+from app.utils.state_store import state_store
+
+from pzem_simulator import SimulatedSession
+
+OFFLINE_SLAVE = 3
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    """A simulated bus on the default port, with slave 3 offline."""
+    session = SimulatedSession(MODBUS_PORT, offline={OFFLINE_SLAVE}, frame_time=0)
+    monkeypatch.setitem(modbus_sessions.sessions, MODBUS_PORT, session)
+    return session.bus
+
+
+def use_devices(monkeypatch, **slave_ids):
+    devices = {
+        name: pzem_sensor.PzemDevice(name, slave_id, timeout=0.02)
+        for name, slave_id in slave_ids.items()
+    }
+    monkeypatch.setattr(pzem_sensor, "PZEM_DEVICES", devices)
+    return devices
+
+
+def stored(model, device):
+    db = Sessionlocal()
+    try:
+        return db.query(model).filter(model.device == device).count()
+    finally:
+        db.close()
+
+
+def test_poller_polls_round_robin(database, bus, monkeypatch):
+    devices = use_devices(monkeypatch, main=1, lighting=2)
+    poller = PzemPoller(devices, rate=50, interval=3600)
+    before = stored(PzemAggregate, "lighting")
+
+    async def poll():
+        poller.start()
+        await asyncio.sleep(0.3)
+        await poller.stop()
+
+    asyncio.run(poll())
+
+    slaves = [slave_id for slave_id, _ in bus.requests]
+    assert len(slaves) >= 4
+    assert slaves == [1, 2] * (len(slaves) // 2) + [1] * (len(slaves) % 2)
+    # stop() stores the partial interval of every meter
+    assert stored(PzemAggregate, "lighting") == before + 1
+
+
+def test_poller_keeps_polling_past_an_offline_meter(database, bus, monkeypatch):
+    devices = use_devices(monkeypatch, main=1, dead=OFFLINE_SLAVE)
+    poller = PzemPoller(devices, rate=20, interval=3600)
+
+    async def poll():
+        poller.start()
+        await asyncio.sleep(0.3)
+        await poller.stop()
+
+    asyncio.run(poll())
+
+    status = poller.status()["devices"]
+    assert status["main"]["total_samples"] > 0
+    assert status["dead"]["total_samples"] == 0
+    assert status["dead"]["total_missed"] > 0
+    assert status["dead"]["last_error"].startswith("ModbusInvalidResponseError")
+
+
+def test_read_pzem_data_stores_the_meters_that_answer(database, bus, monkeypatch):
+    use_devices(monkeypatch, main=1, dead=OFFLINE_SLAVE)
+    before = stored(Pzem, "main")
+
+    asyncio.run(pzem_sensor.read_pzem_data())
+
+    assert stored(Pzem, "main") == before + 1
+    assert stored(Pzem, "dead") == 0
+
+
+def test_read_pzem_data_fails_when_no_meter_answers(database, bus, monkeypatch):
+    use_devices(monkeypatch, dead=OFFLINE_SLAVE)
+
+    with pytest.raises(RuntimeError, match="dead"):
+        asyncio.run(pzem_sensor.read_pzem_data())
+
+
+def test_reset_energy_counter_checks_the_echo(bus, monkeypatch):
+    use_devices(monkeypatch, main=1)
+    asyncio.run(pzem_sensor.read_device(pzem_sensor.get_device("main")))
+    bus.meters[1].energy = 1500.0
+
+    pzem_sensor.reset_energy_counter("main")
+
+    assert bus.meters[1].energy == 0.0
+    assert bus.requests[-1] == (1, pzem_sensor.RESET_ENERGY)
+
+
+def test_reset_energy_counter_raises_without_echo(bus, monkeypatch):
+    use_devices(monkeypatch, main=1)
+    monkeypatch.setattr(bus, "reset_input_buffer", lambda: None)
+    monkeypatch.setattr(bus, "write", lambda frame: None)  # the meter stays silent
+
+    with pytest.raises(RuntimeError, match="did not confirm"):
+        pzem_sensor.reset_energy_counter("main")
+
+
+def test_reset_energy_counter_offline_meter(bus, monkeypatch):
+    use_devices(monkeypatch, dead=OFFLINE_SLAVE)
+
+    with pytest.raises(ModbusInvalidResponseError):
+        pzem_sensor.reset_energy_counter("dead")
+
+
+def reading(power=100.0, voltage=220.0):
+    return {
+        "voltage": voltage, "current": power / voltage, "power": power,
+        "energy": 10, "frequency": 50.0, "power_factor": 0.9,
+    }
+
+
+def test_flush_keeps_rows_the_database_refused(database, monkeypatch):
+    devices = use_devices(monkeypatch, main=1)
+    poller = PzemPoller(devices, rate=1, interval=60)
+    before = stored(Pzem, "main"), stored(PzemAggregate, "main")
+    poller.buffers[0].add(reading(), datetime.now())
+
+    def locked(aggregates, events):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(pzem_poller, "_write", locked)
+    with pytest.raises(OperationalError):
+        asyncio.run(poller.flush())
+    # The interval's reading is stored regardless; the aggregate waits
+    assert stored(Pzem, "main") == before[0] + 1
+    assert len(poller.aggregates) == 1
+
+    monkeypatch.undo()
+    asyncio.run(poller.flush())
+    assert stored(PzemAggregate, "main") == before[1] + 1
+    assert poller.aggregates == []
+
+
+def test_stop_stores_open_events(database, monkeypatch):
+    devices = use_devices(monkeypatch, main=1)
+    poller = PzemPoller(devices, rate=1, interval=60)
+    before = stored(PzemEvent, "main")
+
+    async def run():
+        poller.task = asyncio.create_task(asyncio.sleep(3600))
+        poller.buffers[0].add(reading(voltage=180.0), datetime.now())  # a sag that is still going on
+        await poller.stop()
+
+    asyncio.run(run())
+
+    assert stored(PzemEvent, "main") == before + 1
+    assert poller.buffers[0].excursions == {}
+
+
+def test_bulk_upload_updates_every_device_stream(database):
+    from app.routers.pzem import PzemBulkRequest
+
+    state_store.invalidate(Pzem)
+    start = datetime.now()
+    ingest.insert_reading(Pzem, {**reading(power=100.0), "timestamp": start, "device": "main"})
+    items = [
+        {**reading(power=999.0), "timestamp": (start + timedelta(minutes=1)).isoformat(), "device": "main"},
+        {**reading(power=50.0), "timestamp": (start + timedelta(minutes=2)).isoformat(), "device": "lighting"},
+    ]
+
+    db = Sessionlocal()
+    try:
+        assert ingest.insert_bulk(Pzem, PzemBulkRequest, items, db)["created"] == 2
+        assert state_store.latest(db, Pzem).power == 999.0
+        assert state_store.latest(db, Pzem, "lighting").power == 50.0
+    finally:
+        db.close()
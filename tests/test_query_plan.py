@@ -0,0 +1,6 @@
+from app.utils import query_plan
+
+
+def test_hot_paths_use_indexes(database, capsys):
+    ok = query_plan.check()
+    assert ok, capsys.readouterr().out
@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime
+
+from app.database import Sessionlocal
+from app.models import AHT10, Rollup
+from app.routers.aht10 import delete_aht10
+from app.service import ingest, rollup
+
+
+def day_bucket(db, day):
+    return db.query(Rollup).filter_by(period="day", metric="indoor_humidity", bucket=day).one_or_none()
+
+
+def test_delete_refreshes_its_buckets(database):
+    day = datetime(2021, 3, 4)
+    rows = [
+        ingest.insert_reading(AHT10, {"timestamp": day.replace(hour=hour), "temperature": 20.0, "humidity": humidity})
+        for hour, humidity in [(8, 40.0), (9, 80.0)]
+    ]
+
+    db = Sessionlocal()
+    try:
+        assert day_bucket(db, day).maximum == 80.0
+        asyncio.run(delete_aht10(rows[1].id, db))
+        db.expire_all()
+        bucket = day_bucket(db, day)
+        assert (bucket.count, bucket.maximum) == (1, 40.0)
+        assert db.query(Rollup).filter_by(period="hour", metric="indoor_humidity", bucket=day.replace(hour=9)).count() == 0
+    finally:
+        db.close()
+
+
+def test_full_rebuild_keeps_history_of_pruned_rows(database):
+    pruned_day = datetime(2019, 1, 1)
+    db = Sessionlocal()
+    try:
+        db.add(Rollup(
+            period="day", metric="indoor_humidity", bucket=pruned_day, count=24, total=1200.0,
+            minimum=45.0, maximum=55.0, last=50.0, last_timestamp=pruned_day.replace(hour=23),
+        ))
+        db.commit()
+        ingest.insert_reading(AHT10, {"timestamp": datetime(2021, 6, 1, 12), "temperature": 20.0, "humidity": 50.0})
+
+        rollup.rebuild(db)
+        db.commit()
+
+        assert day_bucket(db, pruned_day).count == 24
+    finally:
+        db.close()
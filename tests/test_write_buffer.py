@@ -0,0 +1,33 @@
+import asyncio
+from datetime import datetime
+
+from app.database import Sessionlocal
+from app.models import AHT10
+from app.service.write_buffer import WriteBuffer
+from app.utils.state_store import state_store
+
+
+def count(model, **filters):
+    db = Sessionlocal()
+    try:
+        return db.query(model).filter_by(**filters).count()
+    finally:
+        db.close()
+
+
+def test_bad_row_does_not_drop_the_batch(database):
+    now = datetime.now()
+    good = [{"timestamp": now, "temperature": 21.5 + i, "humidity": 12.25} for i in range(3)]
+    bad = {"timestamp": "not a timestamp", "temperature": 22.0, "humidity": 12.25}
+    batch = [(AHT10, row) for row in good[:2] + [bad] + good[2:]]
+    state_store.invalidate(AHT10)
+    state_store.record(AHT10, bad)
+    buffer = WriteBuffer(max_rows=10, batch_size=10, flush_interval=1)
+
+    asyncio.run(buffer._flush(batch, []))
+
+    assert count(AHT10, humidity=12.25) == 3
+    assert (buffer.flushed_rows, buffer.failed_rows) == (3, 1)
+    assert buffer.last_error
+    # The dropped row must not linger as the latest reading
+    assert state_store.get(AHT10) is None